@@ -0,0 +1,109 @@
+﻿import numpy as np
+import pandas as pd
+import streamlit as st
+from sklearn.ensemble import IsolationForest
+from analytics.artifacts import cached_artifact
+from analytics.lof1d import local_outlier_factor_1d
+
+# Порог модифицированной z-оценки (Iglewicz & Hoaglin): |z| > 3.5 — выброс
+ROBUST_Z_THRESHOLD = 3.5
+# Если в контексте «рейс × день недели × месяц» меньше строк, базой служит весь рейс
+MIN_CONTEXT_ROWS = 10
+
+
+def _codes(s: pd.Series) -> np.ndarray:
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        return s.cat.codes.to_numpy().astype(np.int64)
+    return pd.factorize(s)[0].astype(np.int64)
+
+
+def _robust_baseline(x: pd.Series, key: np.ndarray):
+    """Медиана, MAD, среднее абсолютное отклонение от медианы и размер группы для каждой строки."""
+    g = x.groupby(key, sort=False)
+    median = g.transform("median")
+    dev = (x - median).abs()
+    gd = dev.groupby(key, sort=False)
+    return median, gd.transform("median"), gd.transform("mean"), g.transform("size")
+
+
+def contextual_scores(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Контекстная оценка аномальности каждой строки относительно сезонной базы
+    своего рейса: медиана и MAD пассажиров по группе рейс × день недели × месяц.
+
+    z = 0.6745 · (x − медиана) / MAD — модифицированная z-оценка; если MAD = 0,
+    знаменатель — 1.2533 · среднее абсолютное отклонение. Группы меньше
+    MIN_CONTEXT_ROWS строк оцениваются по всему рейсу.
+
+    Возвращает DataFrame с тем же индексом, что у df: baseline (медиана), z,
+    anomaly (|z| > ROBUST_Z_THRESHOLD). Строки без даты или рейса — z = NaN.
+    """
+    x = df["passengers"].astype(np.float64)
+    flight = _codes(df["flight_no"])
+    dates = df["dep_date"]
+    valid = (flight >= 0) & dates.notna().to_numpy()
+    season = (dates.dt.dayofweek * 12 + dates.dt.month - 1).fillna(0).to_numpy(np.int64)
+    # одна целочисленная группа вместо трёх колонок; невалидные строки — в группу -1
+    key = np.where(valid, flight * 84 + season, -1)
+    flight_key = np.where(valid, flight, -1)
+
+    median, mad, meanad, size = _robust_baseline(x, key)
+    f_median, f_mad, f_meanad, _ = _robust_baseline(x, flight_key)
+    small = (size < MIN_CONTEXT_ROWS).to_numpy()
+    median = np.where(small, f_median, median)
+    mad = np.where(small, f_mad, mad)
+    meanad = np.where(small, f_meanad, meanad)
+
+    scale = np.where(mad > 0, mad / 0.6745, meanad * 1.2533)
+    diff = x.to_numpy() - median
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(scale > 0, diff / scale, np.where(diff == 0, 0.0, np.sign(diff) * np.inf))
+    z[~valid] = np.nan
+    return pd.DataFrame({"baseline": median, "z": z, "anomaly": np.abs(z) > ROBUST_Z_THRESHOLD}, index=df.index)
+
+
+def contextual_anomalies(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Аномальные строки по contextual_scores: flight_no, dep_date, passengers,
+    baseline, z — по убыванию |z|.
+    """
+    scores = contextual_scores(df)
+    rows = np.flatnonzero(scores["anomaly"].to_numpy())
+    out = df.iloc[rows][["flight_no", "dep_date", "passengers"]].reset_index(drop=True)
+    out["baseline"] = scores["baseline"].to_numpy()[rows]
+    out["z"] = scores["z"].to_numpy()[rows]
+    return out.iloc[np.argsort(-np.abs(out["z"].to_numpy()), kind="stable")].reset_index(drop=True)
+
+
+def model_anomalies(df: pd.DataFrame) -> dict:
+    """
+    Позиции строк, которые IsolationForest и LocalOutlierFactor (по колонке
+    passengers, contamination=1%) считают выбросами: {"iso": ..., "lof": ...}.
+    LOF по одному признаку считается точным одномерным алгоритмом
+    (analytics.lof1d) вместо дерева поиска sklearn.
+    """
+    iso = IsolationForest(contamination=0.01, random_state=42)
+    lof_labels, _ = local_outlier_factor_1d(df["passengers"].to_numpy(), n_neighbors=20, contamination=0.01)
+    return {
+        "iso": np.flatnonzero(iso.fit_predict(df[["passengers"]]) == -1),
+        "lof": np.flatnonzero(lof_labels == -1),
+    }
+
+
+@st.cache_data(show_spinner="Считаем контекстные аномалии…", max_entries=8)
+def cached_contextual_anomalies(dataset_key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    """contextual_anomalies один раз на архив; готовый ночной отчёт (report.py) берётся с диска."""
+    # _df не хэшируется Streamlit: dataset_key — хэш содержимого архива
+    return cached_artifact(dataset_key, "anomalies_contextual", lambda: contextual_anomalies(_df))
+
+
+@st.cache_data(show_spinner="Обучаем IsolationForest и LOF…", max_entries=8)
+def cached_model_anomalies(dataset_key: str, _df: pd.DataFrame) -> dict:
+    """
+    model_anomalies один раз на архив, а не при каждом перезапуске страницы;
+    готовый ночной отчёт (report.py) берётся с диска.
+    """
+    return cached_artifact(
+        dataset_key, "anomalies_model", lambda: model_anomalies(_df),
+        load=lambda ready: {m: ready.row[ready.method == m].to_numpy() for m in ("iso", "lof")},
+    )
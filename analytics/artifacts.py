@@ -0,0 +1,80 @@
+﻿import json, os
+import pandas as pd
+from analytics.diagnostics import cache_miss
+from utils import write_atomic
+
+# Каталог ночных отчётов (report.py): <REPORT_DIR>/<dataset_key>/<имя>.v<версия>.parquet
+# и manifest.json; дашборд берёт готовые результаты оттуда, если они есть
+REPORT_DIR = os.environ.get("AERONAV_REPORT_DIR", "reports")
+# Версии расчёта таблиц отчёта (по умолчанию 1): увеличивать при изменении
+# алгоритма или параметров таблицы. Версия — часть имени файла
+# (<имя>.v<версия>.parquet), поэтому таблица прежней версии не читается
+ARTIFACT_VERSIONS = {
+    "route_profiles": 2,        # частота — рейсов в неделю, не короче MIN_SPAN_DAYS
+    "backtest_metrics": 2,      # горизонты — календарные месяцы
+    "backtest_predictions": 2,
+}
+
+
+def _path(dataset_key: str, name: str) -> str:
+    return os.path.join(REPORT_DIR, dataset_key, name)
+
+
+def _table_path(dataset_key: str, name: str) -> str:
+    return _path(dataset_key, f"{name}.v{ARTIFACT_VERSIONS.get(name, 1)}.parquet")
+
+
+def write_artifact(dataset_key: str, name: str, df: pd.DataFrame) -> str:
+    """Сохраняет таблицу отчёта (Parquet) текущей версии расчёта и возвращает путь."""
+    path = _table_path(dataset_key, name)
+    write_atomic(path, lambda tmp: df.to_parquet(tmp, index=False))
+    return path
+
+
+def read_artifact(dataset_key: str, name: str):
+    """
+    Таблица отчёта для архива dataset_key или None, если её нет или она
+    посчитана другой версией расчёта (см. ARTIFACT_VERSIONS).
+    """
+    if not dataset_key:
+        return None
+    try:
+        return pd.read_parquet(_table_path(dataset_key, name))
+    except (OSError, ValueError):
+        return None
+
+
+def cached_artifact(dataset_key: str, name: str, compute, load=None):
+    """
+    Результат из готовой таблицы ночного отчёта name (load(таблица), если
+    формат результата другой), иначе compute(). Источник отмечается в
+    диагностике: "report" — таблица отчёта, промах — расчёт.
+    """
+    ready = read_artifact(dataset_key, name)
+    if ready is not None:
+        cache_miss("report")
+        return load(ready) if load else ready
+    cache_miss()
+    return compute()
+
+
+def write_manifest(dataset_key: str, manifest: dict) -> str:
+    path = _path(dataset_key, "manifest.json")
+
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+
+    write_atomic(path, write)
+    return path
+
+
+def read_manifest(dataset_key: str):
+    """Описание ночного отчёта (время, разделы, таблицы) или None."""
+    if not dataset_key:
+        return None
+    try:
+        with open(_path(dataset_key, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,142 @@
+﻿import json, os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from analytics.diagnostics import cache_miss
+from analytics import forecast
+from analytics.forecast import HORIZON, PROPHET_PARAMS, fit_prophet, history_key
+from analytics.parallel import pool_map
+from analytics.segments import seasonal_naive_forecast, ses_forecast
+from utils import write_atomic
+
+# Минимальная длина обучающей истории (месяцев) для первой точки отсчёта:
+# годовой сезонности Prophet нужно хотя бы два года
+MIN_TRAIN_MONTHS = 24
+# Сравниваемые модели
+BACKTEST_MODELS = ("prophet", "seasonal_naive", "ses")
+
+
+def _origins(n_months: int, min_train: int) -> list:
+    """Точки отсчёта: число месяцев обучающей истории, после которой строится прогноз."""
+    return list(range(min_train, n_months))
+
+
+def _prophet_origin(ds, y, origin: int, horizon: int) -> np.ndarray:
+    """
+    Задача пула: Prophet на первых origin календарных месяцах (без пропущенных),
+    прогноз на horizon календарных месяцев после них.
+    """
+    hist = pd.DataFrame({"ds": ds[:origin], "y": y[:origin]}).dropna()
+    future = pd.date_range(ds[origin], periods=horizon, freq="MS")
+    _, pred = fit_prophet(hist, PROPHET_PARAMS, horizon, future=future)
+    return pred["yhat"].to_numpy()
+
+
+def backtest(hist: pd.DataFrame, horizon: int = HORIZON, min_train: int = MIN_TRAIN_MONTHS,
+             models=BACKTEST_MODELS, workers: int = None):
+    """
+    Бэктест со скользящей точкой отсчёта на помесячной истории hist (ds, y):
+    для каждой точки отсчёта модель обучается на предшествующих месяцах и
+    прогнозирует horizon месяцев вперёд; прогноз сравнивается с фактом.
+
+    История раскладывается по полному календарю месяцев: месяцы без рейсов
+    (их нет в monthly_history) — пропуски, поэтому горизонт h — это ровно h-й
+    календарный месяц, а «год назад» у сезонного наивного — тот же месяц.
+    Прогнозы на пропущенные месяцы и без прогноза (нет прошлогоднего значения)
+    в метрики не входят.
+
+    Prophet (с параметрами страницы прогноза) обучается на всех точках отсчёта
+    параллельно в пуле процессов; сезонный наивный прогноз и экспоненциальное
+    сглаживание считаются векторно.
+
+    Возвращает (metrics, predictions):
+    - metrics: model, horizon, mae, mape (%, по месяцам с ненулевым фактом), n;
+    - predictions: model, origin (первый прогнозный месяц), horizon, ds, y, yhat.
+    """
+    series = hist.set_index("ds")["y"].astype(np.float64)
+    if len(series):
+        series = series.reindex(pd.date_range(series.index.min(), series.index.max(), freq="MS"))
+    ds = series.index.to_numpy()
+    y = series.to_numpy()
+    observed = ~np.isnan(y)
+    origins = _origins(len(y), min_train)
+    rows = []
+    if origins:
+        forecasts = {}
+        if "prophet" in models:
+            forecasts["prophet"] = pool_map(
+                _prophet_origin, [(ds, y, o, horizon) for o in origins], workers)
+        # базовые модели дешёвые — считаются в текущем процессе
+        if "seasonal_naive" in models and min_train >= 12:
+            forecasts["seasonal_naive"] = [
+                seasonal_naive_forecast(y[None, :o], horizon)[0] for o in origins]
+        if "ses" in models:
+            filled = np.nan_to_num(y)
+            forecasts["ses"] = [
+                ses_forecast(filled[None, :o], observed[None, :o], horizon)[0] for o in origins]
+
+        for model, preds in forecasts.items():
+            for o, yhat in zip(origins, preds):
+                for h in range(1, horizon + 1):
+                    t = o + h - 1
+                    if t >= len(y):
+                        break
+                    if observed[t] and not np.isnan(yhat[h - 1]):
+                        rows.append((model, ds[o], h, ds[t], y[t], float(yhat[h - 1])))
+
+    predictions = pd.DataFrame(rows, columns=["model", "origin", "horizon", "ds", "y", "yhat"])
+    return _metrics(predictions), predictions
+
+
+def _metrics(predictions: pd.DataFrame) -> pd.DataFrame:
+    err = (predictions.yhat - predictions.y).abs()
+    ape = (err / predictions.y.where(predictions.y != 0)) * 100
+    out = pd.DataFrame({"model": predictions.model, "horizon": predictions.horizon, "ae": err, "ape": ape})
+    return (out.groupby(["model", "horizon"])
+            .agg(mae=("ae", "mean"), mape=("ape", "mean"), n=("ae", "size"))
+            .reset_index())
+
+
+def _cache_path(key: str) -> str:
+    # через модуль: MODEL_CACHE_DIR можно переназначить после импорта (тесты, bench)
+    return os.path.join(forecast.MODEL_CACHE_DIR, f"backtest-{key}.json")
+
+
+@st.cache_data(show_spinner="Бэктест моделей прогноза…", max_entries=16)
+def _cached_backtest(key: str, _hist: pd.DataFrame, horizon: int, min_train: int, _workers: int = None):
+    # _hist не хэшируется Streamlit: key — хэш истории и параметров; _workers на результат не влияет
+    path = _cache_path(key)
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        cache_miss("disk")
+        return (pd.DataFrame(data["metrics"]),
+                pd.DataFrame(data["predictions"]).astype({"origin": "datetime64[ns]", "ds": "datetime64[ns]"}))
+    except (OSError, ValueError, KeyError):
+        pass
+    cache_miss()
+    metrics, predictions = backtest(_hist, horizon, min_train, workers=_workers)
+    data = json.dumps({
+        "metrics": json.loads(metrics.to_json(orient="records")),
+        "predictions": json.loads(predictions.to_json(orient="records", date_format="iso")),
+    })
+
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+
+    write_atomic(path, write)
+    return metrics, predictions
+
+
+def cached_backtest(hist: pd.DataFrame, horizon: int = HORIZON, min_train: int = MIN_TRAIN_MONTHS,
+                    workers: int = None):
+    """
+    backtest() с кэшем по хэшу истории: в памяти процесса и на диске
+    (MODEL_CACHE_DIR/backtest-<ключ>.json). Повторный запуск на тех же
+    данных не обучает ни одной модели. workers — процессов пула Prophet.
+    """
+    # calendar: горизонты по календарным месяцам (прежние записи считали по строкам истории)
+    key = history_key(hist, {"backtest": PROPHET_PARAMS, "min_train": min_train,
+                             "models": list(BACKTEST_MODELS), "calendar": True}, horizon)
+    return _cached_backtest(key, hist, horizon, min_train, workers)
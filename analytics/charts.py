@@ -0,0 +1,165 @@
+﻿import os
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import streamlit as st
+from analytics.cube import get_cube
+from analytics.diagnostics import cache_miss
+
+# Точек на график, выше которых данные прореживаются на сервере
+MAX_POINTS = int(os.environ.get("AERONAV_CHART_MAX_POINTS", 20_000))
+# С какого числа точек рисуем через WebGL (scattergl) вместо SVG
+WEBGL_POINTS = 2_000
+# Значений цвета в легенде; остальные сворачиваются в OTHER_LABEL
+MAX_LEGEND = 10
+OTHER_LABEL = "Другие"
+# Подписи осей тепловой карты «месяц / день недели»
+MONTH_NAMES = ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
+               'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь']
+WEEKDAY_NAMES = ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье']
+
+
+def fold_categories(s: pd.Series, top: int = MAX_LEGEND, other: str = OTHER_LABEL) -> pd.Series:
+    """top самых частых значений s как есть, остальные — other (строки, без категорий)."""
+    counts = s.value_counts(sort=True)
+    keep = counts.index[:top]
+    out = s.astype(object).where(s.isin(keep), other)
+    return out.astype(str)
+
+
+def _numeric(x) -> np.ndarray:
+    """Ось x как float: даты — в наносекундах, категории — по порядку строк."""
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy("datetime64[ns]").view(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+def minmax_indices(y, n_out: int) -> np.ndarray:
+    """
+    Прореживание min/max: ряд (уже упорядоченный по x) делится на
+    (n_out − 2) / 2 равных корзин, в каждой остаются точки с минимальным и
+    максимальным y, плюс первая и последняя точки ряда. Выбросы и пики
+    сохраняются всегда; точек не больше max(n_out, 4). Возвращает
+    возрастающие позиции.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    buckets = max((n_out - 2) // 2, 1)
+    bucket = np.arange(n) * buckets // n
+    order = np.lexsort((y, bucket))  # внутри корзины — по возрастанию y
+    starts = np.searchsorted(bucket[order], np.arange(buckets))
+    ends = np.append(starts[1:], n) - 1
+    return np.unique(np.concatenate([[0, n - 1], order[starts], order[ends]]))
+
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: n_out точек ряда, упорядоченного по x,
+    сохраняющих форму линии. Первая и последняя точки остаются, из каждой
+    корзины берётся точка с наибольшей площадью треугольника с выбранной
+    точкой предыдущей корзины и средним следующей. Возвращает позиции.
+    """
+    x = _numeric(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1])[:n_out]
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x, avg_y = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - avg_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (avg_y - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def _title(title: str, shown: int, total: int) -> str:
+    if shown >= total:
+        return title
+    return f"{title} (показано {shown:,} из {total:,} точек)".replace(",", " ")
+
+
+def scatter(df: pd.DataFrame, x: str, y: str, color: str = None, title: str = "",
+            max_points: int = MAX_POINTS, top: int = MAX_LEGEND, **kwargs):
+    """
+    px.scatter с ограниченным объёмом данных для браузера:
+    - цвет — не больше top значений плюс «Другие», то есть не больше top + 1 трасс;
+    - больше max_points точек — прореживание min/max по оси x (выбросы остаются);
+    - от WEBGL_POINTS точек — WebGL (scattergl).
+    """
+    total = len(df)
+    data = df.dropna(subset=[x, y])
+    if len(data) > max_points:
+        data = data.iloc[np.argsort(_numeric(data[x]), kind="stable")]
+        data = data.iloc[minmax_indices(data[y], max_points)]
+    if color is not None:
+        data = data.assign(**{color: fold_categories(data[color], top)})
+    return px.scatter(
+        data, x=x, y=y, color=color, title=_title(title, len(data), total),
+        render_mode="webgl" if len(data) >= WEBGL_POINTS else "svg", **kwargs
+    )
+
+
+def line(df: pd.DataFrame, x: str, y: str, color: str = None, title: str = "",
+         max_points: int = MAX_POINTS, top: int = MAX_LEGEND, **kwargs):
+    """
+    px.line для временных рядов: каждый ряд (по значению color, свёрнутому до
+    top + «Другие») прореживается LTTB до своей доли max_points.
+    Ряды, свёрнутые в «Другие», суммируются по x.
+    """
+    data = df.dropna(subset=[x, y])
+    if color is not None:
+        data = data.assign(**{color: fold_categories(data[color], top)})
+        data = data.groupby([color, x], as_index=False, sort=False)[y].sum()
+        groups = [g for _, g in data.groupby(color, sort=False)]
+    else:
+        groups = [data]
+    total = len(data)
+    budget = max(max_points // max(len(groups), 1), 3)
+    parts = []
+    for g in groups:
+        g = g.sort_values(x, kind="stable")
+        parts.append(g.iloc[lttb_indices(g[x], g[y], budget)])
+    data = pd.concat(parts) if parts else data
+    return px.line(
+        data, x=x, y=y, color=color, title=_title(title, len(data), total),
+        render_mode="webgl" if len(data) >= WEBGL_POINTS else "svg", **kwargs
+    )
+
+
+def _month_dow_figure(counts: np.ndarray):
+    """Интерактивная тепловая карта 12 × 7 с подписями значений."""
+    fig = px.imshow(
+        counts, x=WEEKDAY_NAMES, y=MONTH_NAMES, text_auto=True, aspect="auto",
+        color_continuous_scale="YlOrRd",
+        labels={"x": "День недели", "y": "Месяц", "color": "Рейсов"},
+    )
+    fig.update_xaxes(side="bottom")
+    return fig
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _cached_month_dow_heatmap(dataset_key: str, start, end, _df: pd.DataFrame):
+    # _df не хэшируется Streamlit: dataset_key — хэш содержимого архива
+    cache_miss()
+    return _month_dow_figure(get_cube(_df).month_dow_counts(start, end))
+
+
+def month_dow_heatmap(df: pd.DataFrame, start, end):
+    """Тепловая карта числа рейсов «месяц / день недели» за период, кэш по (архив, start, end)."""
+    key = df.attrs.get("dataset_key")
+    if key is None:
+        return _month_dow_figure(get_cube(df).month_dow_counts(start, end))
+    return _cached_month_dow_heatmap(key, start, end, df)
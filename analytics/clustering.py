@@ -0,0 +1,160 @@
+﻿import numpy as np
+import pandas as pd
+import streamlit as st
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import StandardScaler
+from analytics.artifacts import cached_artifact
+from utils import flight_month_sums, is_aggregated
+
+# Признаки профиля маршрута и их подписи
+ROUTE_FEATURES = {
+    "mean_load": "Средняя загрузка",
+    "volatility": "Волатильность (CV)",
+    "seasonality": "Сезонность",
+    "frequency": "Рейсов в неделю",
+}
+# Меньше недели между первым и последним вылетом частоту считаем за неделю:
+# иначе единичный рейс давал бы 7 рейсов в неделю
+MIN_SPAN_DAYS = 7
+
+
+def _segment_argmin(values: np.ndarray, seg: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Позиция первого минимума в каждом сегменте плоского массива (сегменты подряд)."""
+    minima = np.minimum.reduceat(values, starts)
+    hit = np.flatnonzero(values == minima[seg])
+    first = np.unique(seg[hit], return_index=True)[1]
+    return hit[first]
+
+
+def kmeans_1d(x, k: int):
+    """
+    Точная (оптимальная по сумме квадратов отклонений) кластеризация
+    одномерных данных на k кластеров динамическим программированием —
+    детерминированно, без случайных стартов и повторов, как у KMeans.
+
+    В оптимальном решении кластеры — отрезки отсортированного массива:
+    D[m][i] = min_j D[m-1][j] + SSE(j..i-1). Точка разбиения монотонна по i,
+    поэтому каждый слой считается «разделяй и властвуй» — уровнями рекурсии,
+    векторно по всем отрезкам уровня: O(k·n·log n) операций NumPy и
+    O(k·log n) шагов Python.
+
+    Возвращает (labels, centers): номер кластера для каждой точки в исходном
+    порядке и центры, упорядоченные по возрастанию (кластер 0 — наименьший).
+    """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    n = len(x)
+    k = min(k, n)
+    if k == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    order = np.argsort(x, kind="stable")
+    xs = x[order] - x.mean()  # центрирование уменьшает потерю точности в SSE
+    s1 = np.concatenate([[0.0], np.cumsum(xs)])
+    s2 = np.concatenate([[0.0], np.cumsum(xs * xs)])
+
+    def sse(j, i):
+        # SSE точек j..i-1
+        cnt = i - j
+        return s2[i] - s2[j] - (s1[i] - s1[j]) ** 2 / cnt
+
+    prev = sse(0, np.arange(1, n + 1)) if n else np.zeros(0)
+    prev = np.concatenate([[np.inf], prev])  # D[1][i], i = 0..n
+    opt = np.zeros((k + 1, n + 1), dtype=np.int64)
+    for m in range(2, k + 1):
+        cur = np.full(n + 1, np.inf)
+        # отрезки i ∈ [lo, hi] с точкой разбиения j ∈ [olo, ohi]
+        lo, hi = np.array([m]), np.array([n])
+        olo, ohi = np.array([m - 1]), np.array([n - 1])
+        while len(lo):
+            mid = (lo + hi) // 2
+            top = np.minimum(mid - 1, ohi)
+            counts = top - olo + 1
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            seg = np.repeat(np.arange(len(mid)), counts)
+            j = olo[seg] + np.arange(counts.sum()) - starts[seg]
+            val = prev[j] + sse(j, mid[seg])
+            best = _segment_argmin(val, seg, starts)
+            cur[mid] = val[best]
+            opt[m, mid] = j[best]
+            # левые половины: [lo, mid-1] с [olo, opt]; правые: [mid+1, hi] с [opt, ohi]
+            left, right = lo <= mid - 1, mid + 1 <= hi
+            lo, hi, olo, ohi = (
+                np.concatenate([lo[left], mid[right] + 1]),
+                np.concatenate([mid[left] - 1, hi[right]]),
+                np.concatenate([olo[left], j[best][right]]),
+                np.concatenate([j[best][left], ohi[right]]),
+            )
+        prev = cur
+
+    # восстановление границ кластеров справа налево
+    labels_sorted = np.empty(n, dtype=np.int64)
+    centers = np.empty(k)
+    i = n
+    for m in range(k, 0, -1):
+        j = opt[m, i] if m > 1 else 0
+        labels_sorted[j:i] = m - 1
+        centers[m - 1] = x[order[j:i]].mean()
+        i = j
+    labels = np.empty(n, dtype=np.int64)
+    labels[order] = labels_sorted
+    return labels, centers
+
+
+def mean_load(df: pd.DataFrame) -> pd.DataFrame:
+    """Средняя загрузка по рейсам: flight_no, passengers — и по строкам, и по агрегатам."""
+    if not is_aggregated(df):
+        return df.groupby("flight_no", observed=True)["passengers"].mean().reset_index()
+    g = df.flight_months.groupby("flight_no", observed=True)[["passengers", "rows"]].sum()
+    return (g["passengers"] / g["rows"]).rename("passengers").reset_index()
+
+
+def route_profiles(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Профиль каждого рейса (flight_no) по строкам выгрузки:
+    - mean_load — средняя загрузка;
+    - volatility — коэффициент вариации загрузки (std / mean);
+    - seasonality — размах средних по календарным месяцам, делённый на среднюю;
+    - frequency — рейсов в неделю за период от первого до последнего вылета
+      включительно (не короче MIN_SPAN_DAYS).
+
+    Считается по суммам рейс × месяц (utils.flight_month_sums: число рейсов,
+    Σx, Σx²), поэтому одинаково работает и на строках load_data, и на агрегатах
+    load_aggregates.
+    """
+    fm = flight_month_sums(df)
+    g = fm.groupby("flight_no", observed=True)
+    sums = g[["passengers", "rows", "passengers_sq"]].sum()
+    n = sums["rows"].astype(np.int64)
+    mean = sums["passengers"] / n
+    # выборочная дисперсия (ddof=1) из сумм; у рейса из одной строки — 0
+    var = (sums["passengers_sq"] - sums["passengers"] * mean) / (n - 1).where(n > 1)
+    std = np.sqrt(var.clip(lower=0)).fillna(0)
+    span_days = (g["last"].max() - g["first"].min()).dt.days
+    monthly = fm.groupby(["flight_no", fm["month"].dt.month], observed=True)[["passengers", "rows"]].sum()
+    gm = (monthly["passengers"] / monthly["rows"]).groupby(level=0, observed=True)
+    month_range = gm.max() - gm.min()
+
+    nonzero = mean.replace(0, np.nan)
+    return pd.DataFrame({
+        "mean_load": mean,
+        "volatility": (std / nonzero).fillna(0),
+        "seasonality": (month_range / nonzero).fillna(0),
+        "frequency": n * 7 / (span_days + 1).clip(lower=MIN_SPAN_DAYS),
+    }).rename_axis("flight_no").reset_index()
+
+
+def cluster_routes(profiles: pd.DataFrame, k: int, random_state: int = 42) -> np.ndarray:
+    """
+    Кластеры маршрутов по стандартизованным признакам профиля мини-пакетным
+    k-means: стоимость итерации не зависит от числа маршрутов, поэтому десятки
+    тысяч маршрутов кластеризуются интерактивно.
+    """
+    x = StandardScaler().fit_transform(profiles[list(ROUTE_FEATURES)])
+    km = MiniBatchKMeans(n_clusters=k, random_state=random_state, batch_size=4096, n_init=3)
+    return km.fit_predict(x)
+
+
+@st.cache_data(show_spinner="Считаем профили маршрутов…", max_entries=8)
+def cached_route_profiles(dataset_key: str, _df: pd.DataFrame) -> pd.DataFrame:
+    # _df не хэшируется Streamlit: dataset_key — хэш содержимого архива
+    return cached_artifact(dataset_key, "route_profiles", lambda: route_profiles(_df))
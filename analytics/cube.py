@@ -0,0 +1,398 @@
+﻿import numpy as np
+import pandas as pd
+import streamlit as st
+from dataclasses import dataclass
+from analytics.diagnostics import cache_miss
+from utils import concat_frames, date_bounds, date_slice, is_aggregated, read_arrow
+
+# Измерения куба
+DIMENSIONS = ("airline", "airport", "flight_no", "contract_short")
+# Предел ячеек одной матрицы префиксных сумм (дни × значения измерения).
+# Если дней × значений больше, префиксы хранятся по блокам из нескольких дней,
+# а края диапазона досчитываются по строкам куба.
+PREFIX_MAX_CELLS = 4_000_000
+
+
+@dataclass
+class _Prefix:
+    """Строки куба одного измерения и их префиксные суммы по блокам дней."""
+    categories: pd.Index
+    codes: np.ndarray        # код значения для каждой строки
+    day: np.ndarray          # индекс дня (от first_day) для каждой строки, по возрастанию
+    passengers: np.ndarray   # сумма пассажиров в строке
+    flights: np.ndarray      # число исходных строк в строке
+    day_offsets: np.ndarray  # n_days + 1, первая строка каждого дня
+    block: int               # дней в блоке
+    cum_pax: np.ndarray      # (блоков + 1) × значений, накопленные пассажиры
+    cum_flights: np.ndarray  # (блоков + 1) × значений, накопленное число рейсов
+
+
+@dataclass
+class DailyCube:
+    """
+    Агрегатный куб: дневные суммы пассажиров и число рейсов (строк выгрузки)
+    в разрезе airline × airport × flight_no × contract_short.
+
+    У каждого измерения (prefix[dim]) строки отсортированы по дню,
+    day_offsets[d] — первая строка дня d, поэтому любой диапазон дат — это
+    срез строк. Для каждого измерения есть префиксные суммы по оси дат: сумма
+    за период — разность двух строк матрицы, время запроса не зависит от
+    числа исходных строк.
+
+    Куб из строк (load_data) — общие строки airline × airport × flight_no ×
+    contract_short для всех измерений. В кубе из агрегатов потокового режима
+    (load_aggregates) у каждого измерения свои строки, а flight_no — помесячно
+    (flights_by_month): суммы по рейсам — за целые календарные месяцы,
+    пересекающие период.
+    """
+    first_day: pd.Timestamp
+    n_days: int
+    daily_pax: np.ndarray     # n_days + 1, префикс пассажиров по дням
+    daily_flights: np.ndarray  # n_days + 1, префикс рейсов по дням
+    prefix: dict
+    month_offsets: np.ndarray  # календарных месяцев + 1, первый день каждого месяца
+    month_flights: np.ndarray  # уникальных рейсов (flight_no) в каждом месяце куба
+    flights_by_month: bool = False  # строки flight_no — рейс × месяц (потоковый режим)
+
+    @property
+    def last_day(self) -> pd.Timestamp:
+        return self.first_day + pd.Timedelta(days=self.n_days - 1)
+
+    def day_range(self, start, end):
+        """Полуинтервал индексов дней [i, j) для дат start..end включительно."""
+        i = (pd.Timestamp(start).normalize() - self.first_day).days
+        j = (pd.Timestamp(end).normalize() - self.first_day).days + 1
+        i = min(max(i, 0), self.n_days)
+        j = min(max(j, i), self.n_days)
+        return i, j
+
+    def total(self, start, end) -> dict:
+        i, j = self.day_range(start, end)
+        return {
+            "passengers": int(self.daily_pax[j] - self.daily_pax[i]),
+            "flights": int(self.daily_flights[j] - self.daily_flights[i]),
+        }
+
+    def _whole_months(self, i: int, j: int):
+        """Дни [i, j), расширенные до границ календарных месяцев."""
+        if i >= j:
+            return i, j
+        first = self.month_offsets.searchsorted(i, "right") - 1
+        last = self.month_offsets.searchsorted(j - 1, "right") - 1
+        return int(self.month_offsets[first]), int(self.month_offsets[last + 1])
+
+    def _sums(self, dim: str, i: int, j: int):
+        """Суммы пассажиров и рейсов по значениям измерения за дни [i, j)."""
+        p = self.prefix[dim]
+        if dim == "flight_no" and self.flights_by_month:
+            i, j = self._whole_months(i, j)
+        n = len(p.categories)
+        pax = np.zeros(n, dtype=np.int64)
+        flights = np.zeros(n, dtype=np.int64)
+        # целые блоки — из префиксов
+        bi = -(-i // p.block)
+        bj = j // p.block
+        if bi < bj:
+            pax += p.cum_pax[bj] - p.cum_pax[bi]
+            flights += p.cum_flights[bj] - p.cum_flights[bi]
+            edges = [(i, bi * p.block), (bj * p.block, j)]
+        else:
+            edges = [(i, j)]
+        # неполные блоки по краям — по строкам куба
+        for a, b in edges:
+            if a >= b:
+                continue
+            lo, hi = p.day_offsets[a], p.day_offsets[b]
+            codes = p.codes[lo:hi]
+            pax += np.bincount(codes, weights=p.passengers[lo:hi], minlength=n + 1)[:n].astype(np.int64)
+            flights += np.bincount(codes, weights=p.flights[lo:hi], minlength=n + 1)[:n].astype(np.int64)
+        return pax, flights
+
+    def top(self, dim: str, start, end, n: int = 5) -> pd.DataFrame:
+        """Топ-n значений измерения по пассажирам за период: колонки dim, value."""
+        i, j = self.day_range(start, end)
+        pax, flights = self._sums(dim, i, j)
+        present = np.flatnonzero(flights)
+        idx = present[np.argsort(-pax[present], kind="stable")[:n]]
+        return pd.DataFrame({dim: self.prefix[dim].categories[idx], "value": pax[idx]})
+
+    def mean_load(self, start, end) -> pd.DataFrame:
+        """Средняя загрузка (пассажиров на рейс) по каждому рейсу за период."""
+        i, j = self.day_range(start, end)
+        pax, flights = self._sums("flight_no", i, j)
+        present = np.flatnonzero(flights)
+        return pd.DataFrame({
+            "flight_no": self.prefix["flight_no"].categories[present],
+            "passengers": pax[present] / flights[present],
+        })
+
+    def _days(self, i: int, j: int) -> pd.DatetimeIndex:
+        return pd.date_range(self.first_day + pd.Timedelta(days=i), periods=j - i, freq="D")
+
+    def daily(self, start, end) -> pd.DataFrame:
+        """Дневные суммы за период: dep_date, passengers, flights."""
+        i, j = self.day_range(start, end)
+        return pd.DataFrame({
+            "dep_date": self._days(i, j),
+            "passengers": np.diff(self.daily_pax[i:j + 1]),
+            "flights": np.diff(self.daily_flights[i:j + 1]),
+        })
+
+    def _month_of_days(self, i: int, j: int) -> np.ndarray:
+        """Номер календарного месяца куба (от месяца first_day) для дней [i, j)."""
+        days = self._days(i, j)
+        return np.asarray((days.year - self.first_day.year) * 12 + days.month - self.first_day.month)
+
+    def _unique_flights(self, a: int, b: int) -> int:
+        """Число уникальных рейсов по строкам куба за дни [a, b)."""
+        p = self.prefix["flight_no"]
+        codes = np.unique(p.codes[p.day_offsets[a]:p.day_offsets[b]])
+        return int((codes < len(p.categories)).sum())  # без пропусков flight_no
+
+    def monthly(self, start, end) -> pd.DataFrame:
+        """
+        Помесячно за период: month ("YYYY-MM"), passengers и число уникальных
+        рейсов (flight_no). Месяцы без рейсов не выводятся.
+
+        Уникальные рейсы целых месяцев берутся из month_flights (считаются один
+        раз при построении куба); по строкам куба досчитываются только неполные
+        месяцы на краях периода. В потоковом режиме (flights_by_month) рейсы
+        известны только помесячно — у неполных месяцев они за весь месяц.
+        """
+        i, j = self.day_range(start, end)
+        if i == j:
+            return pd.DataFrame({"month": [], "passengers": [], "flights": []})
+        month_of_day = self._month_of_days(i, j)
+        first, last = int(month_of_day[0]), int(month_of_day[-1])
+        local = month_of_day - first
+        n_months = last - first + 1
+
+        pax = np.bincount(local, weights=np.diff(self.daily_pax[i:j + 1]), minlength=n_months)
+        rows = np.bincount(local, weights=np.diff(self.daily_flights[i:j + 1]), minlength=n_months)
+
+        uniq = self.month_flights[first:last + 1].copy()
+        for m in () if self.flights_by_month else {first, last}:
+            a, b = max(i, self.month_offsets[m]), min(j, self.month_offsets[m + 1])
+            if (a, b) != (self.month_offsets[m], self.month_offsets[m + 1]):
+                uniq[m - first] = self._unique_flights(a, b)
+
+        months = pd.period_range(self.first_day + pd.Timedelta(days=i), periods=n_months, freq="M").astype(str)
+        out = pd.DataFrame({"month": months, "passengers": pax.astype(np.int64), "flights": uniq})
+        return out[rows > 0].reset_index(drop=True)
+
+    def monthly_matrix(self, dim: str):
+        """
+        Помесячные ряды по каждому значению измерения за весь период куба.
+
+        Возвращает (categories, months, passengers, flights): months — PeriodIndex
+        всех календарных месяцев от первого до последнего дня, матрицы
+        размером значений × месяцев.
+        """
+        p = self.prefix[dim]
+        n = len(p.categories) + 1
+        if self.n_days == 0:
+            empty = np.zeros((n - 1, 0), dtype=np.int64)
+            return p.categories, pd.PeriodIndex([], freq="M"), empty, empty
+        days = self._days(0, self.n_days)
+        months = pd.period_range(self.first_day, self.last_day, freq="M")
+        month_of_day = np.asarray((days.year - days.year[0]) * 12 + days.month - days.month[0])
+        key = p.codes.astype(np.int64) * len(months) + month_of_day[p.day]
+
+        def matrix(weights):
+            m = np.bincount(key, weights=weights, minlength=n * len(months)).reshape(n, len(months))
+            return m[:-1].astype(np.int64)
+
+        return p.categories, months, matrix(p.passengers), matrix(p.flights)
+
+    def month_dow_counts(self, start, end) -> np.ndarray:
+        """
+        Число рейсов (строк выгрузки) за период в разрезе месяц × день недели:
+        матрица 12 × 7 (январь..декабрь × понедельник..воскресенье). Считается
+        одним bincount по дневным суммам с целочисленными кодами месяца и дня
+        недели, без таблиц и строковых колонок.
+        """
+        i, j = self.day_range(start, end)
+        days = self._days(i, j)
+        month = days.month.to_numpy() - 1
+        dow = (self.first_day.dayofweek + np.arange(i, j)) % 7
+        counts = np.bincount(month * 7 + dow, weights=np.diff(self.daily_flights[i:j + 1]), minlength=84)
+        return counts.astype(np.int64).reshape(12, 7)
+
+
+def _codes(s: pd.Series):
+    """Коды и словарь значений колонки; пропуски получают код len(categories)."""
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, categories = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, categories = pd.factorize(s, sort=True)
+    codes = codes.astype(np.int32)
+    codes[codes < 0] = len(categories)
+    return codes, pd.Index(categories)
+
+
+def _prefix(day, codes, categories, passengers, flights, n_days) -> _Prefix:
+    n = len(categories) + 1  # + ячейка для пропусков
+    block = max(1, -(-n_days * n // PREFIX_MAX_CELLS))
+    n_blocks = -(-n_days // block)
+    key = (day // block).astype(np.int64) * n + codes
+
+    def cum(weights):
+        m = np.bincount(key, weights=weights, minlength=n_blocks * n).reshape(n_blocks, n)
+        out = np.zeros((n_blocks + 1, n - 1), dtype=np.int64)
+        np.cumsum(m[:, :-1], axis=0, out=out[1:])
+        return out
+
+    return _Prefix(categories, codes, day, passengers, flights, np.searchsorted(day, np.arange(n_days + 1)),
+                   block, cum(passengers), cum(flights))
+
+
+def _month_flights(first_day: pd.Timestamp, n_days: int, p: _Prefix):
+    """
+    Первые дни календарных месяцев куба (индексы дней, месяцев + 1) и число
+    уникальных рейсов в каждом месяце — по матрице присутствия рейс × месяц.
+    """
+    if n_days == 0:
+        return np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    days = pd.date_range(first_day, periods=n_days, freq="D")
+    month_of_day = np.asarray((days.year - first_day.year) * 12 + days.month - first_day.month)
+    n_months = int(month_of_day[-1]) + 1
+    month_offsets = np.searchsorted(month_of_day, np.arange(n_months + 1))
+    n = len(p.categories) + 1
+    pairs = np.unique(month_of_day[p.day].astype(np.int64) * n + p.codes)
+    pairs = pairs[pairs % n < n - 1]  # без пропусков flight_no
+    return month_offsets, np.bincount(pairs // n, minlength=n_months)
+
+
+def _day_axis(first, last):
+    """Первый день куба и число дней по первой и последней дате данных."""
+    if pd.isna(first):
+        return pd.Timestamp("1970-01-01"), 0
+    first_day = first.normalize()
+    return first_day, (last.normalize() - first_day).days + 1
+
+
+def _day_index(dates: np.ndarray, first_day: pd.Timestamp) -> np.ndarray:
+    return ((dates - first_day.to_datetime64()) // np.timedelta64(1, "D")).astype(np.int32)
+
+
+def _cube(first_day: pd.Timestamp, n_days: int, prefix: dict, flights_by_month: bool = False) -> DailyCube:
+    # дневные итоги — по строкам любого измерения без flight_no: в них все исходные строки
+    rows = prefix[DIMENSIONS[0]]
+
+    def daily_prefix(weights):
+        out = np.zeros(n_days + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows.day, weights=weights, minlength=n_days).astype(np.int64), out=out[1:])
+        return out
+
+    month_offsets, month_flights = _month_flights(first_day, n_days, prefix["flight_no"])
+    return DailyCube(
+        first_day=first_day, n_days=n_days,
+        daily_pax=daily_prefix(rows.passengers), daily_flights=daily_prefix(rows.flights), prefix=prefix,
+        month_offsets=month_offsets, month_flights=month_flights, flights_by_month=flights_by_month,
+    )
+
+
+def _aggregates_cube(agg) -> DailyCube:
+    """
+    Куб из агрегатов потокового режима (utils.Aggregates): строки airline,
+    airport и contract_short — их дневные таблицы, строки flight_no — таблица
+    рейс × месяц, каждая строка которой приходится на первый день месяца.
+    """
+    first_day, n_days = _day_axis(*date_bounds(agg))
+    prefix = {}
+    for dim, t in agg.daily.items():
+        codes, categories = _codes(t[dim])
+        day = _day_index(t["dep_date"].to_numpy(), first_day)
+        prefix[dim] = _prefix(day, codes, categories, t["passengers"].to_numpy(), t["rows"].to_numpy(), n_days)
+    fm = agg.flight_months
+    codes, categories = _codes(fm["flight_no"])
+    # первый месяц начинается раньше first_day
+    day = np.maximum(_day_index(fm["month"].to_numpy(), first_day), 0)
+    prefix["flight_no"] = _prefix(day, codes, categories, fm["passengers"].to_numpy(), fm["rows"].to_numpy(), n_days)
+    return _cube(first_day, n_days, prefix, flights_by_month=True)
+
+
+def build_cube(df: pd.DataFrame) -> DailyCube:
+    """Строит DailyCube из DataFrame, который возвращает utils.load_data, или из utils.Aggregates."""
+    if is_aggregated(df):
+        return _aggregates_cube(df)
+    # строки отсортированы по дате: без NaT — это срез, а границы — первая/последняя строка
+    df = date_slice(df)
+    first_day, n_days = _day_axis(*date_bounds(df))
+    day = _day_index(df.dep_date.to_numpy(), first_day)
+
+    coded = {dim: _codes(df[dim]) for dim in DIMENSIONS}
+    keys = pd.DataFrame({"day": day, **{dim: coded[dim][0] for dim in DIMENSIONS}})
+    keys["passengers"] = df.passengers.to_numpy()
+    if "rows" in df.columns:
+        # сохранённый куб (cube_frame): строка — уже группа рейсов
+        keys["rows"] = df["rows"].to_numpy()
+        agg = {"sum": ("passengers", "sum"), "size": ("rows", "sum")}
+    else:
+        agg = {"sum": ("passengers", "sum"), "size": ("passengers", "size")}
+    cube = keys.groupby(["day", *DIMENSIONS], sort=True).agg(**agg).reset_index()
+
+    day = cube["day"].to_numpy()
+    passengers = cube["sum"].to_numpy(np.int64)
+    flights = cube["size"].to_numpy(np.int64)
+    prefix = {
+        dim: _prefix(day, cube[dim].to_numpy(np.int32), coded[dim][1], passengers, flights, n_days)
+        for dim in DIMENSIONS
+    }
+    return _cube(first_day, n_days, prefix)
+
+
+def cube_frame(cube: DailyCube) -> pd.DataFrame:
+    """
+    Строки куба из строк load_data как DataFrame (dep_date, измерения-категории,
+    passengers, rows): его можно сохранить и снова передать в build_cube.
+    У куба потокового режима общих строк измерений нет.
+    """
+    if cube.flights_by_month:
+        raise ValueError("у куба из агрегатов потокового режима нет общих строк измерений")
+    rows = cube.prefix[DIMENSIONS[0]]
+    out = {"dep_date": cube.first_day + pd.to_timedelta(rows.day, unit="D")}
+    for dim in DIMENSIONS:
+        p = cube.prefix[dim]
+        codes = np.where(p.codes == len(p.categories), -1, p.codes)
+        out[dim] = pd.Categorical.from_codes(codes, p.categories)
+    out["passengers"] = rows.passengers
+    out["rows"] = rows.flights
+    return pd.DataFrame(out)
+
+
+def extend_cube(cube: DailyCube, df: pd.DataFrame) -> DailyCube:
+    """
+    Куб после добавления новых строк df к данным cube: группируются только
+    строки куба и новые строки, без прохода по истории. cube — куб из строк
+    (не из Aggregates потокового режима), df — DataFrame в формате load_data
+    или строк cube_frame (с колонкой rows). Строки df не должны повторять уже
+    учтённые (дедупликация — до вызова).
+    """
+    new = cube_frame(build_cube(df.sort_values("dep_date", kind="stable", ignore_index=True)))
+    if cube.n_days == 0:
+        return build_cube(new)
+    merged = concat_frames([cube_frame(cube), new])
+    return build_cube(merged.sort_values("dep_date", kind="stable", ignore_index=True))
+
+
+@st.cache_resource(show_spinner="Строим агрегатный куб…", max_entries=4)
+def _cached_cube(dataset_key: str, _df: pd.DataFrame) -> DailyCube:
+    # _df не хэшируется Streamlit: ключ — хэш содержимого исходного архива
+    # куб, сохранённый при дозагрузке в хранилище (analytics.store, attrs["cube_path"]),
+    # не строится заново
+    path = _df.attrs.get("cube_path")
+    frame = read_arrow(path) if path else None
+    if frame is not None:
+        cache_miss("disk")
+        return build_cube(frame)
+    cache_miss()
+    return build_cube(_df)
+
+
+def get_cube(df: pd.DataFrame) -> DailyCube:
+    """Куб для набора данных: строится один раз на архив и общий для всех сессий."""
+    key = df.attrs.get("dataset_key")
+    if key is None:
+        return build_cube(df)
+    return _cached_cube(key, df)
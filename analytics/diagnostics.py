@@ -0,0 +1,166 @@
+﻿import contextvars, json, os, threading, time, uuid
+from contextlib import contextmanager
+
+# JSON Lines с замерами этапов (по строке на этап); пусто — не пишем
+DIAG_LOG = os.environ.get("AERONAV_DIAG_LOG", "")
+# Период опроса RSS во время этапа, с
+SAMPLE_INTERVAL = 0.005
+
+# Замеры текущего прогона скрипта Streamlit (у каждой сессии свой поток и контекст)
+_run = contextvars.ContextVar("aeronav_diag_run", default=None)
+_log_lock = threading.Lock()
+
+
+class PeakRSS:
+    """Пиковый RSS процесса за время блока with, в байтах (None вне Linux)."""
+
+    def __init__(self):
+        self._page = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+        self.start = self.peak = self._rss()
+        self._stop = threading.Event()
+
+    def _rss(self):
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * self._page
+        except OSError:
+            return None
+
+    def _poll(self):
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            self.peak = max(self.peak, self._rss())
+
+    def __enter__(self):
+        self.start = self.peak = self._rss()
+        if self.start is not None:
+            self._thread = threading.Thread(target=self._poll, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.start is not None:
+            self._stop.set()
+            self._thread.join()
+            self.peak = max(self.peak, self._rss())
+
+    @property
+    def delta(self):
+        return None if self.start is None else self.peak - self.start
+
+
+def begin_run(enabled: bool, session: str = None):
+    """
+    Начинает сбор замеров для прогона скрипта. Без enabled и без DIAG_LOG
+    stage() ничего не измеряет.
+    """
+    if not (enabled or DIAG_LOG):
+        _run.set(None)
+        return
+    _run.set({"id": uuid.uuid4().hex[:12], "session": session, "records": [], "stack": []})
+
+
+def records() -> list:
+    """Замеры текущего прогона в порядке начала этапов (вложенные — после родителя)."""
+    run = _run.get()
+    return list(run["records"]) if run else []
+
+
+@contextmanager
+def stage(name: str, rows: int = None, cached: bool = False):
+    """
+    Замер этапа: время, прирост пикового RSS, число строк.
+    cached=True — этап вызывает кэшируемую функцию: если её тело не выполнилось
+    (не было cache_miss()), этап помечается как попадание в кэш.
+    """
+    run = _run.get()
+    if run is None:
+        yield None
+        return
+    rec = {"stage": name, "rows": rows, "cache": "hit" if cached else None, "_cached": cached}
+    rec["depth"] = len(run["stack"])
+    run["stack"].append(rec)
+    run["records"].append(rec)
+    t = time.perf_counter()
+    try:
+        with PeakRSS() as mem:
+            yield rec
+    finally:
+        run["stack"].pop()
+        rec["seconds"] = round(time.perf_counter() - t, 4)
+        rec["peak_mb"] = None if mem.delta is None else round(mem.delta / 2 ** 20, 1)
+        del rec["_cached"]
+        _log(run, rec)
+
+
+def record(**fields):
+    """Дописывает поля (например rows) в текущий этап."""
+    run = _run.get()
+    if run and run["stack"]:
+        run["stack"][-1].update(fields)
+
+
+def cache_miss(kind: str = "miss"):
+    """Вызывается в теле кэшируемой функции: ближайший этап с cached=True — промах (или kind)."""
+    run = _run.get()
+    if not run:
+        return
+    for rec in reversed(run["stack"]):
+        if rec.get("_cached"):
+            rec["cache"] = kind
+            return
+
+
+def _log(run: dict, rec: dict):
+    if not DIAG_LOG:
+        return
+    line = json.dumps({"ts": time.time(), "run": run["id"], "session": run["session"], **rec},
+                      ensure_ascii=False)
+    with _log_lock, open(DIAG_LOG, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def _children(recs: list, i: int):
+    """Прямые вложенные этапы записи i (записи идут в порядке начала)."""
+    depth = recs[i]["depth"]
+    for r in recs[i + 1:]:
+        if r["depth"] <= depth:
+            return
+        if r["depth"] == depth + 1:
+            yield r
+
+
+def plotly_chart(fig, **kwargs):
+    """
+    st.plotly_chart с замером сериализации и размера фигуры (байт JSON).
+    Streamlit не отдаёт свой JSON фигуры, поэтому размер считается отдельной
+    сериализацией — до этапа, чтобы не входить в его время, и только при
+    включённых замерах.
+    """
+    import streamlit as st
+    size = len(fig.to_json()) if _run.get() is not None else None
+    with stage("chart") as rec:
+        st.plotly_chart(fig, **kwargs)
+        if rec is not None:
+            rec["bytes"] = size
+
+
+def panel():
+    """Таблица замеров прогона в боковой панели."""
+    import pandas as pd
+    import streamlit as st
+    recs = records()
+    if not recs:
+        return
+    df = pd.DataFrame(recs)
+    df["own"] = [r.get("seconds", 0) - sum(c.get("seconds", 0) for c in _children(recs, i))
+                 for i, r in enumerate(recs)]
+    df["stage"] = ["  " * d + s for d, s in zip(df["depth"], df["stage"])]
+    cols = [c for c in ("stage", "seconds", "own", "peak_mb", "rows", "cache", "bytes") if c in df]
+    with st.sidebar.expander("Диагностика прогона", expanded=True):
+        st.dataframe(df[cols].rename(columns={
+            "stage": "Этап", "seconds": "Время, с", "own": "Без вложенных, с", "peak_mb": "Пик RSS, МБ",
+            "rows": "Строк", "cache": "Кэш", "bytes": "JSON, байт",
+        }), hide_index=True, use_container_width=True)
+        st.caption("«Без вложенных» у load_data — в основном хэширование файла для st.cache_resource.")
+        if DIAG_LOG:
+            st.caption(f"Журнал: {DIAG_LOG}")
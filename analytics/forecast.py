@@ -0,0 +1,169 @@
+﻿import hashlib, json, os
+import numpy as np
+import pandas as pd
+import streamlit as st
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+from analytics.cube import get_cube
+from analytics.diagnostics import cache_miss
+from utils import evict_lru, is_aggregated, write_atomic
+
+# Обученные модели Prophet и их прогнозы на диске:
+# <ключ>.json — модель, <ключ>.parquet — прогноз, prefix-<ключ истории без
+# последнего месяца>.txt — ключ модели (для тёплого старта того же ряда)
+MODEL_CACHE_DIR = "model_cache"
+MODEL_CACHE_MAX_BYTES = int(os.environ.get("AERONAV_MODEL_CACHE_MAX_BYTES", 256 * 1024 ** 2))
+
+# Параметры модели и горизонт прогноза (месяцев)
+PROPHET_PARAMS = {"yearly_seasonality": True, "weekly_seasonality": False, "daily_seasonality": False}
+HORIZON = 6
+# Тёплый старт — от модели, обученной на этой же истории без стольких последних месяцев
+WARM_START_LOOKBACK = 12
+
+
+def monthly_history(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Помесячный пассажиропоток (ds — начало месяца, y — пассажиры) из дневного
+    куба, в потоковом режиме — из помесячных итогов агрегатов.
+    """
+    if is_aggregated(df):
+        return pd.DataFrame({"ds": df.monthly["month"], "y": df.monthly["passengers"]})
+    cube = get_cube(df)
+    daily = cube.daily(cube.first_day, cube.last_day)
+    hist = daily.groupby(daily.dep_date.dt.to_period("M"))[["passengers", "flights"]].sum()
+    # месяцы без рейсов — пропуски, а не нули
+    hist = hist[hist.flights > 0].reset_index()
+    return pd.DataFrame({"ds": hist.dep_date.dt.to_timestamp(), "y": hist.passengers})
+
+
+def _params_json(params: dict, periods: int) -> str:
+    return json.dumps({"params": params, "periods": periods}, sort_keys=True)
+
+
+def history_key(hist: pd.DataFrame, params: dict = PROPHET_PARAMS, periods: int = HORIZON) -> str:
+    """Ключ модели: хэш истории (ds, y) и параметров."""
+    h = hashlib.sha256(_params_json(params, periods).encode())
+    h.update(hist["ds"].to_numpy("datetime64[ns]").tobytes())
+    h.update(hist["y"].to_numpy(np.float64).tobytes())
+    return h.hexdigest()
+
+
+def warm_start_params(m: Prophet) -> dict:
+    """Параметры обученной модели как начальное приближение для новой (рецепт из документации Prophet)."""
+    res = {}
+    for pname in ["k", "m", "sigma_obs"]:
+        res[pname] = m.params[pname][0][0]
+    for pname in ["delta", "beta"]:
+        res[pname] = m.params[pname][0]
+    return res
+
+
+def fit_prophet(hist: pd.DataFrame, params: dict = PROPHET_PARAMS, periods: int = HORIZON, init: dict = None,
+                freq: str = "M", future: pd.DatetimeIndex = None):
+    """
+    Обучает Prophet на истории (ds, y) и строит прогноз на periods месяцев. Без кэша.
+    freq — частота будущих дат: "M" (концы месяцев, как на странице прогноза)
+    или "MS" (начала месяцев, как ds в истории). future — явные даты прогноза
+    (вместо periods дат после истории); прогноз тогда только по ним.
+    """
+    m = Prophet(**params)
+    if init is not None:
+        # несовпадающие по размеру параметры Prophet сам заменит значениями по умолчанию
+        m.fit(hist[["ds", "y"]], init=init)
+    else:
+        m.fit(hist[["ds", "y"]])
+    if future is not None:
+        return m, m.predict(pd.DataFrame({"ds": future}))
+    future = m.make_future_dataframe(periods=periods, freq=freq)
+    return m, m.predict(future)
+
+
+def _load_model(key: str):
+    """Модель и прогноз с диска или None."""
+    model_path = os.path.join(MODEL_CACHE_DIR, f"{key}.json")
+    forecast_path = os.path.join(MODEL_CACHE_DIR, f"{key}.parquet")
+    try:
+        with open(model_path, encoding="utf-8") as f:
+            m = model_from_json(f.read())
+        forecast = pd.read_parquet(forecast_path)
+    except (OSError, ValueError, KeyError):
+        return None
+    for p in (model_path, forecast_path):
+        try:
+            os.utime(p)
+        except OSError:
+            pass
+    return m, forecast
+
+
+def _save_model(key: str, hist: pd.DataFrame, params: dict, periods: int, m: Prophet, forecast: pd.DataFrame):
+    model_path = os.path.join(MODEL_CACHE_DIR, f"{key}.json")
+    forecast_path = os.path.join(MODEL_CACHE_DIR, f"{key}.parquet")
+
+    def write_model(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(model_to_json(m))
+
+    def write_pointer(tmp):
+        with open(tmp, "w") as f:
+            f.write(key)
+
+    write_atomic(model_path, write_model)
+    write_atomic(forecast_path, forecast.to_parquet)
+    if len(hist) > 1:
+        write_atomic(_prefix_path(history_key(hist.iloc[:-1], params, periods)), write_pointer)
+    evict_lru(MODEL_CACHE_DIR, MODEL_CACHE_MAX_BYTES, keep={model_path, forecast_path})
+
+
+def _prefix_path(prefix_key: str) -> str:
+    return os.path.join(MODEL_CACHE_DIR, f"prefix-{prefix_key}.txt")
+
+
+def _previous_model(hist: pd.DataFrame, params: dict, periods: int):
+    """
+    Модель того же ряда для тёплого старта или None: обученная на истории hist
+    без k последних месяцев (k до WARM_START_LOOKBACK) либо на истории, которая
+    совпадает с ней во всём, кроме последнего месяца (месяц был неполным).
+    Модели других архивов и рядов сюда не попадают — порядок обучения не важен.
+    """
+    for k in range(1, min(WARM_START_LOOKBACK, len(hist) - 1) + 1):
+        prefix = history_key(hist.iloc[:-k], params, periods)
+        loaded = _load_model(prefix)
+        if loaded is None:
+            try:
+                with open(_prefix_path(prefix)) as f:
+                    loaded = _load_model(f.read().strip())
+            except OSError:
+                pass
+        if loaded is not None:
+            return loaded[0]
+    return None
+
+
+@st.cache_resource(show_spinner="Обучаем модель прогноза…", max_entries=32)
+def _cached_forecast(key: str, _hist: pd.DataFrame, params_json: str):
+    # _hist не хэшируется Streamlit: key уже содержит хэш истории и параметров
+    spec = json.loads(params_json)
+    params, periods = spec["params"], spec["periods"]
+    loaded = _load_model(key)
+    if loaded is not None:
+        cache_miss("disk")
+        return loaded
+    cache_miss()
+    prev = _previous_model(_hist, params, periods)
+    m, forecast = fit_prophet(_hist, params, periods,
+                              init=warm_start_params(prev) if prev is not None else None)
+    _save_model(key, _hist, params, periods, m, forecast)
+    return m, forecast
+
+
+def cached_forecast(hist: pd.DataFrame, params: dict = PROPHET_PARAMS, periods: int = HORIZON):
+    """
+    Модель Prophet и прогноз для истории hist (ds, y).
+
+    Одинаковая история с одинаковыми параметрами не переобучается: модель ищется
+    в памяти процесса, затем на диске (MODEL_CACHE_DIR). Новая история (например,
+    добавился месяц) обучается с тёплым стартом от модели того же ряда, см.
+    _previous_model. Возвращённые объекты общие для всех сессий — не изменяйте их.
+    """
+    return _cached_forecast(history_key(hist, params, periods), hist, _params_json(params, periods))
@@ -0,0 +1,118 @@
+﻿import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Строк на один векторный блок: в памяти несколько массивов блок × k float64
+CHUNK_ROWS = 65_536
+
+
+def _chunks(n: int):
+    for lo in range(0, n, CHUNK_ROWS):
+        yield lo, min(lo + CHUNK_ROWS, n)
+
+
+def _windows(a: np.ndarray, k: int, left_pad, right_pad) -> np.ndarray:
+    """
+    Скользящие окна длины k по массиву, дополненному k значениями с обеих
+    сторон: представление sliding_window_view, без копий. Кандидаты в соседи
+    точки i отсортированного массива — _left(w, ...)[i] и _right(w, ...)[i].
+    """
+    return sliding_window_view(np.concatenate([np.full(k, left_pad), a, np.full(k, right_pad)]), k)
+
+
+def _left(w: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """k позиций слева от точек lo..hi-1, ближние первыми."""
+    return w[lo:hi, ::-1]
+
+
+def _right(w: np.ndarray, lo: int, hi: int) -> np.ndarray:
+    """k позиций справа от точек lo..hi-1, ближние первыми."""
+    k = w.shape[1]
+    return w[lo + k + 1:hi + k + 1]
+
+
+def _neighbour_masks(n_left: np.ndarray, k: int):
+    """Какие из k левых и k правых кандидатов — соседи, если слева взято n_left."""
+    step = np.arange(k)
+    return step < n_left[:, None], step < (k - n_left)[:, None]
+
+
+def knn_sorted(xs: np.ndarray, k: int):
+    """
+    Точные k ближайших соседей для отсортированного одномерного массива xs
+    (сама точка не считается своим соседом).
+
+    В одномерном случае k ближайших к xs[i] — это L ближайших слева и k − L
+    ближайших справа: слияние двух отсортированных списков расстояний.
+    L = число j из 1..k, для которых j-й левый существует и не дальше
+    (k − j + 1)-го правого, так что всё считается векторно скользящими окнами
+    за O(n·k) после сортировки, без дерева поиска. При равных расстояниях
+    предпочитается левый сосед.
+
+    Возвращает (k_dist, n_left): расстояние до k-го соседа и L для каждой точки.
+    """
+    n = len(xs)
+    wx = _windows(xs, k, -np.inf, np.inf)
+    k_dist = np.empty(n)
+    n_left = np.empty(n, dtype=np.int32)
+    for lo, hi in _chunks(n):
+        x0 = xs[lo:hi, None]
+        d_left = x0 - _left(wx, lo, hi)
+        d_right = _right(wx, lo, hi) - x0
+        # j-й левый (j = 1..k) против (k - j + 1)-го правого
+        take = ((d_left <= d_right[:, ::-1]) & np.isfinite(d_left)).sum(axis=1)
+        rows = np.arange(hi - lo)
+        last_left = np.where(take > 0, d_left[rows, np.maximum(take - 1, 0)], 0.0)
+        last_right = np.where(take < k, d_right[rows, np.minimum(k - take - 1, k - 1)], 0.0)
+        k_dist[lo:hi] = np.maximum(last_left, last_right)
+        n_left[lo:hi] = take
+    return k_dist, n_left
+
+
+def local_outlier_factor_1d(x, n_neighbors: int = 20, contamination: float = 0.01):
+    """
+    LocalOutlierFactor для одного признака по тем же формулам, что и
+    sklearn.neighbors.LocalOutlierFactor (fit_predict, metric="minkowski", p=2):
+    reach-dist, lrd = 1 / (mean(reach-dist) + 1e-10), LOF = mean(lrd соседей) / lrd,
+    порог — перцентиль contamination от negative_outlier_factor.
+
+    Возвращает (labels, negative_outlier_factor) в исходном порядке строк:
+    labels = -1 для выбросов и 1 для остальных. Совпадает со sklearn, пока
+    у точек нет равноудалённых соседей на k-й позиции; при таких совпадениях
+    sklearn выбирает соседа произвольно, а здесь — левого.
+
+    Память — O(n): соседи восстанавливаются по числу левых соседей L.
+    """
+    x = np.asarray(x, dtype=np.float64).ravel()
+    n = len(x)
+    if n < 2:
+        return np.ones(n, dtype=np.int64), -np.ones(n)
+    k = min(n_neighbors, n - 1)
+
+    order = np.argsort(x, kind="stable")
+    xs = x[order]
+    k_dist, n_left = knn_sorted(xs, k)
+
+    wx = _windows(xs, k, -np.inf, np.inf)
+
+    # локальная плотность достижимости
+    wk = _windows(k_dist, k, 0.0, 0.0)
+    lrd = np.empty(n)
+    for lo, hi in _chunks(n):
+        x0 = xs[lo:hi, None]
+        m_left, m_right = _neighbour_masks(n_left[lo:hi], k)
+        reach_left = np.maximum(x0 - _left(wx, lo, hi), _left(wk, lo, hi))
+        reach_right = np.maximum(_right(wx, lo, hi) - x0, _right(wk, lo, hi))
+        reach = np.where(m_left, reach_left, 0.0).sum(axis=1) + np.where(m_right, reach_right, 0.0).sum(axis=1)
+        lrd[lo:hi] = 1.0 / (reach / k + 1e-10)
+
+    wl = _windows(lrd, k, 0.0, 0.0)
+    nof = np.empty(n)
+    for lo, hi in _chunks(n):
+        m_left, m_right = _neighbour_masks(n_left[lo:hi], k)
+        lrd_sum = (np.where(m_left, _left(wl, lo, hi), 0.0).sum(axis=1)
+                   + np.where(m_right, _right(wl, lo, hi), 0.0).sum(axis=1))
+        nof[order[lo:hi]] = -(lrd_sum / k / lrd[lo:hi])
+
+    offset = np.percentile(nof, 100.0 * contamination)
+    labels = np.where(nof < offset, -1, 1)
+    return labels, nof
@@ -0,0 +1,28 @@
+﻿import logging, multiprocessing, os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _quiet_worker():
+    # cmdstanpy пишет в лог о каждом запуске Stan
+    logging.getLogger("cmdstanpy").setLevel(logging.WARNING)
+    logging.getLogger("prophet").setLevel(logging.WARNING)
+
+
+def pool_map(fn, tasks: list, workers: int = None) -> list:
+    """
+    Выполняет fn(*task) для каждой задачи в пуле процессов и возвращает
+    результаты в порядке задач. Одна задача или workers=1 — в текущем процессе,
+    без пула (так вложенные вызовы внутри процесса пула не плодят процессы).
+
+    fn должна быть функцией уровня модуля (её импортирует дочерний процесс).
+    Пул создаётся через spawn: процесс Streamlit с его потоками не форкается,
+    и так же код работает в Windows.
+    """
+    if len(tasks) <= 1 or workers == 1:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(
+        max_workers=min(len(tasks), workers or os.cpu_count() or 1),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_quiet_worker,
+    ) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
@@ -0,0 +1,138 @@
+﻿import numpy as np
+import pandas as pd
+import streamlit as st
+from analytics.artifacts import cached_artifact
+from analytics.cube import get_cube
+from analytics.forecast import HORIZON, PROPHET_PARAMS, fit_prophet
+from analytics.parallel import pool_map
+
+# Измерения, по которым строятся прогнозы сегментов, и их подписи
+SEGMENT_DIMENSIONS = {
+    "airline": "Авиакомпании",
+    "airport": "Аэропорты",
+    "contract_short": "Договоры",
+    "flight_no": "Рейсы",
+}
+# Ряд обучается Prophet, если в нём не меньше стольких месяцев с рейсами;
+# короткие и разреженные ряды прогнозирует быстрая модель на NumPy
+MIN_PROPHET_MONTHS = 24
+# Коэффициент сглаживания простой экспоненциальной модели
+SES_ALPHA = 0.3
+# Рядов Prophet на одну задачу пула процессов
+SEGMENTS_PER_TASK = 8
+
+
+def segment_matrix(df: pd.DataFrame, dim: str):
+    """
+    Помесячные ряды пассажиров по значениям измерения dim.
+
+    Возвращает (segments, months, y, active): y и active — матрицы сегментов ×
+    календарных месяцев; active — были ли у сегмента рейсы в месяце.
+    """
+    segments, months, pax, flights = get_cube(df).monthly_matrix(dim)
+    return segments, months, pax.astype(np.float64), flights > 0
+
+
+def ses_forecast(y: np.ndarray, active: np.ndarray, horizon: int = HORIZON) -> np.ndarray:
+    """
+    Простое экспоненциальное сглаживание сразу для всех рядов (строки y).
+    Уровень стартует с первого рейса ряда; месяцы, в которых нет данных ни по
+    одному ряду (пропуски выгрузки), пропускаются. Прогноз — последний уровень.
+    """
+    n, t = y.shape
+    if t == 0:
+        return np.zeros((n, horizon))
+    started = np.cumsum(active, axis=1) > 0
+    observed = active.any(axis=0)
+    level = y[:, 0].copy()
+    for j in range(1, t):
+        if not observed[j]:
+            continue
+        level = np.where(started[:, j - 1], SES_ALPHA * y[:, j] + (1 - SES_ALPHA) * level, y[:, j])
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def seasonal_naive_forecast(y: np.ndarray, horizon: int = HORIZON) -> np.ndarray:
+    """Сезонный наивный прогноз: значение того же календарного месяца год назад (нужно t >= 12)."""
+    t = y.shape[1]
+    return y[:, t - 12 + np.arange(horizon) % 12]
+
+
+def fast_forecast(y: np.ndarray, active: np.ndarray, horizon: int = HORIZON):
+    """
+    Векторный прогноз сразу для всех рядов (строки y):
+    - сезонный наивный — для рядов, у которых с первого рейса прошло не меньше
+      12 месяцев;
+    - простое экспоненциальное сглаживание — для остальных.
+
+    Возвращает (yhat, model): сегменты × horizon и название модели для каждого ряда.
+    """
+    n, t = y.shape
+    yhat = ses_forecast(y, active, horizon)
+    model = np.full(n, "ses", dtype=object)
+    if t >= 12:
+        started = np.cumsum(active, axis=1) > 0
+        seasonal = started.any(axis=1) & (t - started.argmax(axis=1) >= 12)
+        yhat[seasonal] = seasonal_naive_forecast(y[seasonal], horizon)
+        model[seasonal] = "seasonal_naive"
+    return yhat, model
+
+
+def _prophet_task(series, horizon):
+    """Задача пула: обучает Prophet для пачки рядов [(ds, y), ...]."""
+    out = []
+    for ds, y in series:
+        _, forecast = fit_prophet(pd.DataFrame({"ds": ds, "y": y}), PROPHET_PARAMS, horizon, freq="MS")
+        out.append(forecast["yhat"].to_numpy()[-horizon:])
+    return out
+
+
+def segment_forecast(df: pd.DataFrame, dim: str, fast: bool = False, horizon: int = HORIZON,
+                     workers: int = None) -> pd.DataFrame:
+    """
+    Прогноз на horizon месяцев для каждого значения измерения dim.
+
+    Длинные ряды (от MIN_PROPHET_MONTHS месяцев с рейсами) обучаются Prophet
+    параллельно в пуле процессов, остальные — быстрой моделью fast_forecast.
+    fast=True — быстрая модель для всех рядов.
+
+    Возвращает «длинную» таблицу: dimension, segment, ds (начало месяца),
+    yhat (неотрицательное целое), model.
+    """
+    segments, months, y, active = segment_matrix(df, dim)
+    yhat, model = fast_forecast(y, active, horizon)
+
+    long = np.flatnonzero(active.sum(axis=1) >= MIN_PROPHET_MONTHS) if not fast else np.array([], dtype=int)
+    if len(long):
+        ds = months.to_timestamp()
+        series = []
+        for i in long:
+            # от первого рейса сегмента; месяцы без данных во всей выгрузке — пропуски
+            keep = np.cumsum(active[i]) > 0
+            keep &= active.any(axis=0)
+            series.append((ds[keep], y[i, keep]))
+        chunks = [(series[k:k + SEGMENTS_PER_TASK], horizon) for k in range(0, len(series), SEGMENTS_PER_TASK)]
+        results = pool_map(_prophet_task, chunks, workers)
+        yhat[long] = np.vstack([r for chunk in results for r in chunk])
+        model[long] = "prophet"
+
+    future = pd.period_range(months[-1] + 1, periods=horizon, freq="M").to_timestamp() if len(months) else \
+        pd.DatetimeIndex([])
+    return pd.DataFrame({
+        "dimension": dim,
+        "segment": np.repeat(np.asarray(segments, dtype=object), horizon),
+        "ds": np.tile(future, len(segments)),
+        "yhat": np.clip(yhat, 0, None).round().astype(np.int64).ravel(),
+        "model": np.repeat(model, horizon),
+    })
+
+
+@st.cache_data(show_spinner="Строим прогнозы по сегментам…", max_entries=16)
+def cached_segment_forecast(dataset_key: str, dim: str, fast: bool, _df: pd.DataFrame) -> pd.DataFrame:
+    # _df не хэшируется Streamlit: dataset_key — хэш содержимого архива
+    return cached_artifact(dataset_key, segment_artifact(dim, fast), lambda: segment_forecast(_df, dim, fast))
+
+
+def segment_artifact(dim: str, fast: bool) -> str:
+    """Имя таблицы ночного отчёта с прогнозом по измерению dim."""
+    return f"segments_{dim}_fast" if fast else f"segments_{dim}"
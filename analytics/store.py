@@ -0,0 +1,182 @@
+﻿import glob, hashlib, json, os
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from filelock import FileLock
+from analytics.cube import build_cube, cube_frame, extend_cube, get_cube
+from analytics.diagnostics import cache_miss, record, stage
+from utils import concat_frames, memory_footprint, parse_archive, read_arrow, write_arrow, write_atomic
+
+# Накопительное хранилище: вся история в одном Arrow IPC (rows-<ключ>.arrow),
+# её куб (cube-<ключ>.arrow, строки cube_frame) и store.json — ключ текущей
+# версии и список уже добавленных файлов.
+# Каждая дозагрузка записывает новую версию целиком (история + новые строки),
+# зато чтение — один memory map без склейки частей. Запись версии и смена
+# манифеста — под блокировкой store.lock
+STORE_DIR = os.environ.get("AERONAV_STORE_DIR", "data_store")
+# Ключ строки выгрузки: повтор рейса в тот же день в том же аэропорту — дубликат
+DEDUP_KEYS = ["flight_no", "dep_date", "airport"]
+
+
+def _manifest_path() -> str:
+    return os.path.join(STORE_DIR, "store.json")
+
+
+def _rows_path(dataset_key: str) -> str:
+    return os.path.join(STORE_DIR, f"rows-{dataset_key}.arrow")
+
+
+def _cube_path(dataset_key: str) -> str:
+    return os.path.join(STORE_DIR, f"cube-{dataset_key}.arrow")
+
+
+def _lock() -> FileLock:
+    """Блокировка хранилища: общая для потоков и процессов (сессий и report.py)."""
+    os.makedirs(STORE_DIR, exist_ok=True)
+    return FileLock(os.path.join(STORE_DIR, "store.lock"))
+
+
+def read_store_manifest() -> dict:
+    """Описание хранилища: dataset_key, files (ключи добавленных файлов), rows, updated."""
+    try:
+        with open(_manifest_path(), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"dataset_key": None, "files": [], "rows": 0, "updated": None}
+
+
+def _write_store_manifest(manifest: dict):
+    def write(tmp):
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2, default=str)
+
+    write_atomic(_manifest_path(), write)
+
+
+def _read_rows(dataset_key: str) -> pd.DataFrame:
+    df = read_arrow(_rows_path(dataset_key)) if dataset_key else None
+    if df is None:
+        return pd.DataFrame()
+    df.attrs["dataset_key"] = dataset_key
+    # готовый куб версии: get_cube не строит его заново по всей истории
+    df.attrs["cube_path"] = _cube_path(dataset_key)
+    return df
+
+
+@st.cache_resource(show_spinner="Читаем хранилище…", max_entries=2)
+def _cached_store(dataset_key: str) -> pd.DataFrame:
+    cache_miss("disk")
+    df = _read_rows(dataset_key)
+    df.attrs["memory"] = memory_footprint(df)
+    return df
+
+
+def load_store() -> pd.DataFrame:
+    """
+    Вся накопленная история в формате load_data (строки отсортированы по
+    dep_date, attrs: dataset_key, memory), общая для всех сессий и только для
+    чтения, как у load_data. Пустой DataFrame — хранилище пусто.
+    Кэш Streamlit — по ключу версии, поэтому после дозагрузки читается новая.
+
+    Версия открывается под блокировкой: append не удалит её файл между чтением
+    манифеста и чтением строк (иначе в кэш попал бы пустой набор).
+    """
+    with _lock():
+        key = read_store_manifest()["dataset_key"]
+        return _cached_store(key) if key else pd.DataFrame()
+
+
+def dedupe(new: pd.DataFrame, existing: pd.DataFrame):
+    """
+    Строки new, которых ещё нет в existing по DEDUP_KEYS. Повторы внутри самого
+    new не отбрасываются: в выгрузке это разные рейсы (например, два рейса
+    с одним номером в один день), дубликат — только строка, уже попавшая в
+    хранилище из прошлых файлов. existing отсортирован по dep_date, поэтому
+    сравнивается только его срез за даты нового файла (и NaT в конце).
+    Возвращает (новые строки, число отброшенных).
+    """
+    unique = new
+    if len(existing):
+        dates = existing["dep_date"].to_numpy()
+        lo, hi = unique["dep_date"].min(), unique["dep_date"].max()
+        i = 0 if pd.isna(lo) else dates.searchsorted(lo.to_datetime64(), "left")
+        if unique["dep_date"].isna().any() or pd.isna(hi):
+            j = len(dates)  # строки без даты сверяются и с NaT в конце истории
+        else:
+            j = dates.searchsorted(hi.to_datetime64(), "right")
+        window = existing.iloc[i:j]
+        seen = pd.MultiIndex.from_frame(unique[DEDUP_KEYS]).isin(pd.MultiIndex.from_frame(window[DEDUP_KEYS]))
+        unique = unique[~seen]
+    return unique, len(new) - len(unique)
+
+
+def append(raw: bytes, is_zip: bool) -> dict:
+    """
+    Дозагрузка файла в хранилище: разбирается только новый файл, его строки
+    без дубликатов (см. dedupe) вливаются в историю, куб обновляется по своим
+    строкам (extend_cube) и сохраняется рядом со строками версии — дашборд и
+    прогнозы не пересчитывают агрегаты по всей истории. Модели Prophet
+    дообучаются с тёплого старта от прошлой версии (analytics.forecast).
+    Файл строк новой версии записывается целиком: история + новые строки.
+
+    Чтение манифеста, запись версии и удаление прошлой — под блокировкой
+    хранилища, поэтому параллельные дозагрузки выполняются по очереди и не
+    теряют строки друг друга. Повторная загрузка того же файла ничего не
+    меняет. Возвращает статистику:
+    file_key, added, duplicates, rows, dataset_key, skipped.
+    """
+    with stage("content_key"):
+        file_key = hashlib.sha256(raw).hexdigest()
+    new = parse_archive(raw, is_zip)
+    with _lock():
+        return _append(file_key, new)
+
+
+def _append(file_key: str, new: pd.DataFrame) -> dict:
+    # вызывается под блокировкой хранилища
+    manifest = read_store_manifest()
+    unchanged = {"file_key": file_key, "added": 0, "duplicates": 0, "rows": manifest["rows"],
+                 "dataset_key": manifest["dataset_key"], "skipped": True}
+    if file_key in manifest["files"]:
+        return unchanged
+
+    old_key = manifest["dataset_key"]
+    with stage("read_store"):
+        store = _read_rows(old_key)
+    if new.empty:
+        return unchanged
+    with stage("dedupe", rows=len(new)):
+        added, duplicates = dedupe(new, store)
+    if len(added) == 0:
+        # всё уже есть: версия не меняется, файл только отмечается как добавленный
+        _write_store_manifest({**manifest, "files": manifest["files"] + [file_key]})
+        return {**unchanged, "duplicates": duplicates, "skipped": False}
+
+    # ключ версии — цепочка: прошлая версия + содержимое добавленного файла
+    key = hashlib.sha256(f"{old_key}:{file_key}".encode()).hexdigest()
+    with stage("merge", rows=len(store) + len(added)):
+        rows = concat_frames([store, added]).sort_values("dep_date", kind="stable", ignore_index=True)
+    with stage("cube", rows=len(added)):
+        cube = extend_cube(get_cube(store), added) if len(store) else build_cube(rows)
+    record(rows=len(added))
+
+    write_arrow(_rows_path(key), rows)
+    write_arrow(_cube_path(key), cube_frame(cube))
+    _write_store_manifest({
+        "dataset_key": key,
+        "files": manifest["files"] + [file_key],
+        "rows": len(rows),
+        "updated": datetime.now().isoformat(timespec="seconds"),
+    })
+    # прошлые версии (строки и куб, а также файлы оборванных дозагрузок) больше
+    # не нужны: манифест уже указывает на новую, а читатели открывают версию
+    # под той же блокировкой
+    current = {_rows_path(key), _cube_path(key)}
+    for path in glob.glob(os.path.join(STORE_DIR, "*.arrow")):
+        if path not in current:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    return {"file_key": file_key, "added": len(added), "duplicates": duplicates, "rows": len(rows),
+            "dataset_key": key, "skipped": False}
@@ -0,0 +1,184 @@
+﻿"""
+HTTP API над тем же набором данных, что строит utils.load_data: топ-N,
+помесячные ряды, аномалии и прогнозы за период — для систем, которым нужны
+цифры дашборда без браузера.
+
+Архив загружается один раз при старте (AERONAV_API_ARCHIVE — путь к ZIP/CSV;
+без него — демонстрационный архив, как в дашборде) и общий для всех запросов.
+Расчёты идут в пуле потоков, готовые ответы (JSON) кэшируются по эндпоинту
+и проверенным значениям параметров (n=10 и n=010 — один ответ), объём кэша
+ограничен в байтах; одинаковые одновременные запросы считаются один раз.
+
+Запуск из корня репозитория:
+    AERONAV_API_ARCHIVE=data.zip uvicorn api:app --port 8000
+Нагрузочный тест: python -m bench.api_load
+"""
+import asyncio, os
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Literal, Optional
+import pandas as pd
+from anyio import to_thread
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Query, Response
+from analytics.cube import get_cube
+from utils import LocalFile, date_bounds, load_data
+
+# Путь к архиву с данными; пусто — демонстрационный архив
+API_ARCHIVE = os.environ.get("AERONAV_API_ARCHIVE", "")
+# Кэш ответов: суммарный размер тел в байтах и время жизни, с
+API_CACHE_BYTES = int(os.environ.get("AERONAV_API_CACHE_BYTES", 256 * 1024 ** 2))
+API_CACHE_TTL = float(os.environ.get("AERONAV_API_CACHE_TTL", 3600))
+# Предельные n у /top и limit у /anomalies
+MAX_TOP_N = 1000
+MAX_ANOMALIES = 100_000
+
+Dimension = Literal["airline", "airport", "flight_no", "contract_short"]
+AnomalyMethod = Literal["contextual", "threshold", "iso", "lof"]
+
+_state = {}
+_responses = TTLCache(maxsize=API_CACHE_BYTES, ttl=API_CACHE_TTL, getsizeof=len)
+_inflight = {}
+
+
+def _load() -> pd.DataFrame:
+    df = load_data(LocalFile(API_ARCHIVE)) if API_ARCHIVE else load_data()
+    if df.empty:
+        raise RuntimeError("нет данных для API")
+    get_cube(df)  # куб строится при старте, а не на первом запросе
+    return df
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _state["df"] = await to_thread.run_sync(_load)
+    yield
+    _state.clear()
+    _responses.clear()
+
+
+app = FastAPI(title="Аналитика отправки рейсов", lifespan=lifespan)
+
+
+def _json(df: pd.DataFrame) -> bytes:
+    return df.to_json(orient="records", date_format="iso", force_ascii=False).encode("utf-8")
+
+
+async def _cached(key: tuple, compute) -> Response:
+    """
+    Ответ из кэша по ключу (имя эндпоинта и проверенные значения параметров);
+    при промахе compute() считается в пуле потоков, а параллельные запросы
+    с тем же ключом ждут один расчёт. Тело больше всего кэша не сохраняется.
+    """
+    body = _responses.get(key)
+    if body is None:
+        task = _inflight.get(key)
+        if task is None:
+            task = _inflight[key] = asyncio.ensure_future(to_thread.run_sync(compute))
+            task.add_done_callback(lambda _: _inflight.pop(key, None))
+        body = await task
+        if len(body) <= _responses.maxsize:
+            _responses[key] = body
+    return Response(body, media_type="application/json")
+
+
+def _range(start: Optional[date], end: Optional[date]):
+    first, last = date_bounds(_state["df"])
+    return pd.Timestamp(start) if start else first, pd.Timestamp(end) if end else last
+
+
+def _between(df: pd.DataFrame, column: str, start, end) -> pd.DataFrame:
+    return df[(df[column] >= start) & (df[column] < end + pd.Timedelta(days=1))]
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok" if "df" in _state else "loading"}
+
+
+@app.get("/dataset")
+async def dataset():
+    df = _state["df"]
+    first, last = date_bounds(df)
+    return {
+        "dataset_key": df.attrs.get("dataset_key"),
+        "rows": len(df),
+        "first_date": first.date().isoformat(),
+        "last_date": last.date().isoformat(),
+        "memory": df.attrs.get("memory"),
+    }
+
+
+@app.get("/top/{dimension}")
+async def top(dimension: Dimension, start: Optional[date] = None,
+              end: Optional[date] = None, n: int = Query(5, ge=1, le=MAX_TOP_N)):
+    """Топ-n значений измерения по пассажирам за период: [{dimension, value}]."""
+    def compute():
+        return _json(get_cube(_state["df"]).top(dimension, *_range(start, end), n))
+    return await _cached(("top", dimension, start, end, n), compute)
+
+
+@app.get("/monthly")
+async def monthly(start: Optional[date] = None, end: Optional[date] = None):
+    """Помесячно за период: [{month, passengers, flights}]."""
+    def compute():
+        return _json(get_cube(_state["df"]).monthly(*_range(start, end)))
+    return await _cached(("monthly", start, end), compute)
+
+
+@app.get("/anomalies")
+async def anomalies(method: AnomalyMethod = "contextual", start: Optional[date] = None,
+                    end: Optional[date] = None, limit: int = Query(1000, ge=1, le=MAX_ANOMALIES)):
+    """
+    Аномальные строки за период, как на странице «Аномалии»:
+    contextual — отклонение от сезонной базы рейса (с baseline и z),
+    threshold — больше mean + 3·std, iso / lof — IsolationForest / LOF.
+    """
+    def compute():
+        from analytics.anomalies import cached_contextual_anomalies, cached_model_anomalies
+        df = _state["df"]
+        key = df.attrs.get("dataset_key")
+        if method == "contextual":
+            rows = cached_contextual_anomalies(key, df)
+        elif method == "threshold":
+            rows = df[df.passengers > df.passengers.mean() + 3 * df.passengers.std()]
+        else:
+            rows = df.iloc[cached_model_anomalies(key, df)[method]]
+        rows = _between(rows, "dep_date", *_range(start, end)).head(limit)
+        cols = [c for c in ("flight_no", "dep_date", "passengers", "baseline", "z") if c in rows]
+        return _json(rows[cols])
+    return await _cached(("anomalies", method, start, end, limit), compute)
+
+
+@app.get("/forecast")
+async def forecast(start: Optional[date] = None, end: Optional[date] = None):
+    """Прогноз Prophet помесячного пассажиропотока: [{ds, yhat, yhat_lower, yhat_upper}], ds в периоде."""
+    def compute():
+        from analytics.forecast import cached_forecast, monthly_history
+        _, fc = cached_forecast(monthly_history(_state["df"]))
+        fc = fc[["ds", "yhat", "yhat_lower", "yhat_upper"]]
+        if start or end:
+            fc = _between(fc, "ds", pd.Timestamp(start or fc.ds.min()), pd.Timestamp(end or fc.ds.max()))
+        return _json(fc)
+    return await _cached(("forecast", start, end), compute)
+
+
+@app.get("/forecast/{dimension}")
+async def segment_forecast(dimension: Dimension, segment: Optional[str] = None,
+                           fast: bool = True, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Прогноз по значениям измерения: [{segment, ds, yhat, model}]. fast=true —
+    быстрые модели (по умолчанию), fast=false — Prophet для длинных рядов.
+    """
+    def compute():
+        from analytics.segments import cached_segment_forecast
+        df = _state["df"]
+        fc = cached_segment_forecast(df.attrs.get("dataset_key"), dimension, fast, df)
+        if segment is not None:
+            fc = fc[fc.segment.astype(str) == segment]
+            if fc.empty:
+                raise HTTPException(404, f"нет сегмента {segment!r}")
+        if start or end:
+            fc = _between(fc, "ds", pd.Timestamp(start or fc.ds.min()), pd.Timestamp(end or fc.ds.max()))
+        return _json(fc.drop(columns="dimension"))
+    return await _cached(("segment_forecast", dimension, segment, fast, start, end), compute)
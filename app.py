@@ -1,10 +1,11 @@
-﻿import streamlit as st
-from utils import load_data
-from pages.main_charts import run as show_main_charts
-from pages.additional_analytics import run as show_additional
-from pages.forecast import run as show_forecast
-from pages.clustering import run as show_clustering
-from pages.anomalies import run as show_anomalies
+﻿import importlib
+import os
+import streamlit as st
+from utils import ARCHIVE_PATH, load_aggregates, load_data, shared_view
+from analytics import diagnostics, store
+from analytics.artifacts import read_manifest
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from pages import SECTIONS
 from PIL import Image
 
 # ——— Настройка страницы ——————————————————————————————————————————————————
@@ -36,32 +37,78 @@ uploaded = st.sidebar.file_uploader(
     "Загрузите ZIP (архив CSV) или одиночный CSV-файл",
     type=["zip", "csv"]
 )
-df = load_data(uploaded)
+
+# замеры этапов прогона: панель в сайдбаре и/или журнал AERONAV_DIAG_LOG
+show_diagnostics = st.sidebar.checkbox("Диагностика производительности", value=False)
+ctx = get_script_run_ctx()
+diagnostics.begin_run(show_diagnostics, ctx.session_id if ctx else None)
+
+# режим загрузки:
+# - потоковый: архив читается блоками и сворачивается в агрегаты (дневные по
+#   измерениям, рейс × месяц, помесячные итоги — utils.Aggregates),
+#   построчный набор в памяти не создаётся (раздел «Аномалии» недоступен);
+# - накопительный: каждый новый файл дозагружается в хранилище (analytics.store)
+#   без дубликатов, дашборд работает по всей накопленной истории
+MODES = ("Один архив", "Потоковый (архивы больше памяти)", "Накопительное хранилище")
+mode = st.sidebar.radio("Режим загрузки", MODES)
+streaming = mode == MODES[1]
+
+if streaming:
+    with diagnostics.stage("load_aggregates", cached=True):
+        if uploaded or not os.path.exists(ARCHIVE_PATH):
+            df = load_aggregates(uploaded)
+        else:
+            df = load_aggregates(path=ARCHIVE_PATH, mtime=os.stat(ARCHIVE_PATH).st_mtime_ns)
+elif mode == MODES[2]:
+    if st.sidebar.button("Добавить файл в хранилище", disabled=not uploaded):
+        with diagnostics.stage("append"):
+            stats = store.append(uploaded.getvalue(), uploaded.name.endswith(".zip"))
+        if stats["skipped"]:
+            st.sidebar.info("Этот файл уже добавлен в хранилище.")
+        else:
+            st.sidebar.success(
+                f"Добавлено строк: {stats['added']:,}, дубликатов: {stats['duplicates']:,}".replace(",", " ")
+            )
+    with diagnostics.stage("load_store", cached=True):
+        df = store.load_store()
+else:
+    with diagnostics.stage("load_data", cached=True):
+        df = load_data(uploaded)
 
 if df.empty:
     st.sidebar.error("Нет данных — пожалуйста, загрузите файл!")
     st.stop()
 
+mem = df.attrs.get("memory")
+if streaming:
+    st.sidebar.caption(
+        f"Исходных строк: {df.attrs['source_rows']:,}, агрегатов: {len(df):,}. "
+        f"Память: {mem['after'] / 2**20:,.1f} МБ".replace(",", " ")
+    )
+elif mem:
+    st.sidebar.caption(
+        f"Строк: {len(df):,}. Память: {mem['after'] / 2**20:,.1f} МБ "
+        f"(без компактной схемы — {mem['before'] / 2**20:,.1f} МБ)".replace(",", " ")
+    )
+
+# готовые результаты ночного отчёта (report.py) для этого архива
+report = read_manifest(df.attrs.get("dataset_key"))
+if report:
+    st.sidebar.caption(f"Ночной отчёт от {report['created']}: {', '.join(report['sections'])}")
+
 # ——— Навигация по разделам ——————————————————————————————————————————————
 section = st.sidebar.radio(
     "Выберите раздел отчёта",
-    (
-        "Основные диаграммы",
-        "Дополнительная аналитика",
-        "Прогноз",
-        "Кластеры",
-        "Аномалии",
-    ),
+    tuple(SECTIONS),
 )
 
 # ——— Маршрутизация ——————————————————————————————————————————————————
-if section == "Основные диаграммы":
-    show_main_charts(df)
-elif section == "Дополнительная аналитика":
-    show_additional(df)
-elif section == "Прогноз":
-    show_forecast(df)
-elif section == "Кластеры":
-    show_clustering(df)
-elif section == "Аномалии":
-    show_anomalies(df)
\ No newline at end of file
+# модуль раздела импортируется при первом выборе, дальше берётся из sys.modules
+with diagnostics.stage(f"import:{SECTIONS[section]}"):
+    page = importlib.import_module(SECTIONS[section])
+# набор общий для всех сессий: странице — своё представление без копии данных
+with diagnostics.stage(f"run:{section}", rows=len(df)):
+    page.run(shared_view(df))
+
+if show_diagnostics:
+    diagnostics.panel()
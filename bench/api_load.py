@@ -0,0 +1,114 @@
+﻿"""
+Нагрузочный тест HTTP API (api.py): конкурентные запросы смеси эндпоинтов,
+пропускная способность (запросов/с) и задержки p50/p95/p99.
+
+Запросы берутся из небольшого набора периодов, поэтому после прогрева
+большинство отвечает кэш — так же, как при опросе API другими системами.
+
+Запуск из корня репозитория (сервер поднимается сам на свободном порту):
+    python -m bench.api_load --archive data.zip --requests 5000 --concurrency 16
+или против уже запущенного сервера:
+    python -m bench.api_load --url http://127.0.0.1:8000
+"""
+import argparse, asyncio, os, random, socket, subprocess, sys, time
+import httpx
+import numpy as np
+
+# Эндпоинты смеси; {start}/{end} подставляются из периодов данных
+PATHS = (
+    "/top/airline?start={start}&end={end}",
+    "/top/airport?start={start}&end={end}",
+    "/top/flight_no?start={start}&end={end}&n=10",
+    "/top/contract_short?start={start}&end={end}",
+    "/monthly?start={start}&end={end}",
+    "/anomalies?method=contextual&start={start}&end={end}&limit=100",
+    "/forecast/airline?fast=true",
+)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_server(archive: str):
+    port = _free_port()
+    env = dict(os.environ, AERONAV_API_ARCHIVE=archive)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("сервер API завершился при старте")
+        try:
+            if httpx.get(f"{url}/health", timeout=1).json()["status"] == "ok":
+                return proc, url
+        except (httpx.HTTPError, ValueError):
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError("сервер API не поднялся")
+
+
+def _periods(info: dict, n: int, rng: random.Random) -> list:
+    first, last = np.datetime64(info["first_date"]), np.datetime64(info["last_date"])
+    span = int((last - first) / np.timedelta64(1, "D"))
+    out = []
+    for _ in range(n):
+        a, b = sorted(rng.randint(0, span) for _ in range(2))
+        out.append((str(first + np.timedelta64(a, "D")), str(first + np.timedelta64(b, "D"))))
+    return out
+
+
+async def _run(url: str, n_requests: int, concurrency: int, periods: list, rng: random.Random):
+    queue = [rng.choice(PATHS).format(start=s, end=e) for s, e in (rng.choice(periods) for _ in range(n_requests))]
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        async def worker():
+            nonlocal errors
+            while queue:
+                path = queue.pop()
+                t = time.perf_counter()
+                r = await client.get(path)
+                latencies.append(time.perf_counter() - t)
+                errors += r.status_code != 200
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return np.array(latencies), errors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--url")
+    target.add_argument("--archive", help="поднять сервер на этом архиве")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--periods", type=int, default=20, help="различных периодов в смеси")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    proc, url = _start_server(args.archive) if args.archive else (None, args.url)
+    try:
+        rng = random.Random(args.seed)
+        periods = _periods(httpx.get(f"{url}/dataset", timeout=60).json(), args.periods, rng)
+        for phase in ("прогрев", "замер"):
+            lat, errors, elapsed = asyncio.run(_run(url, args.requests, args.concurrency, periods, rng))
+            p50, p95, p99 = np.percentile(lat, [50, 95, 99]) * 1000
+            print(f"{phase:<8} {len(lat) / elapsed:>8.0f} запр./с  p50 {p50:.1f} мс  p95 {p95:.1f} мс  "
+                  f"p99 {p99:.1f} мс  ошибок {errors}")
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+﻿"""
+Сравнение одномерного LOF (analytics.lof1d) с sklearn.neighbors.LocalOutlierFactor.
+
+Для каждого размера выборки — время обоих, максимальное расхождение
+negative_outlier_factor на непрерывных данных (без равноудалённых соседей
+результаты должны совпадать до ошибки округления) и доля совпавших меток на
+целочисленных данных, как колонка passengers.
+
+Запуск из корня репозитория:
+    python -m bench.lof_1d --sizes 10000 100000 1000000
+"""
+import argparse, time, warnings
+import numpy as np
+from sklearn.neighbors import LocalOutlierFactor
+from analytics.lof1d import local_outlier_factor_1d
+
+
+def _timed(fn):
+    t = time.perf_counter()
+    out = fn()
+    return out, time.perf_counter() - t
+
+
+def compare(x: np.ndarray, n_neighbors: int = 20, contamination: float = 0.01) -> dict:
+    lof = LocalOutlierFactor(n_neighbors=n_neighbors, contamination=contamination)
+    with warnings.catch_warnings():
+        # на целых данных sklearn предупреждает о дубликатах
+        warnings.simplefilter("ignore", UserWarning)
+        sk_labels, t_sk = _timed(lambda: lof.fit_predict(x[:, None]))
+    (labels, nof), t_1d = _timed(lambda: local_outlier_factor_1d(x, n_neighbors, contamination))
+    return {
+        "sklearn_s": t_sk,
+        "lof1d_s": t_1d,
+        "max_abs_diff": float(np.abs(lof.negative_outlier_factor_ - nof).max()),
+        "label_agreement": float((sk_labels == labels).mean()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--n-neighbors", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'данные':<10}{'n':>10}{'sklearn, с':>12}{'lof1d, с':>10}{'ускорение':>11}"
+          f"{'max |Δ|':>12}{'метки':>9}")
+    for n in args.sizes:
+        # нагрузка рейса: логнормальная с редкими всплесками
+        cont = rng.lognormal(4, 0.5, n)
+        for name, x in (("непрерыв.", cont), ("целые", np.round(cont))):
+            r = compare(x, args.n_neighbors)
+            print(f"{name:<10}{n:>10}{r['sklearn_s']:>12.3f}{r['lof1d_s']:>10.3f}"
+                  f"{r['sklearn_s'] / r['lof1d_s']:>10.1f}x{r['max_abs_diff']:>12.2e}{r['label_agreement']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+﻿"""
+Память при многих сессиях: --sessions «сессий» по очереди открывают один и тот
+же архив через utils.load_data, выполняют страницу (--section) и держат свой
+набор, как вкладки одновременно подключённых аналитиков. Печатается прирост
+RSS процесса после каждой сессии.
+
+Набор общий (st.cache_resource, страницам — shared_view), поэтому прирост не
+должен зависеть от числа сессий. --copy воспроизводит прежнее поведение
+st.cache_data (по распакованной копии набора на каждый вызов) для сравнения.
+
+Запуск из корня репозитория:
+    python -m bench.sessions                          # 1M строк, 20 сессий
+    python -m bench.sessions --size 10M --sessions 5 --copy
+"""
+import argparse, gc, importlib, json, logging, os, pickle, tempfile, warnings
+from analytics.diagnostics import PeakRSS
+from bench.suite import archive
+
+
+def _rss() -> int:
+    return PeakRSS().start or 0
+
+
+def run(size: str, sessions: int, section: str, copy: bool) -> list:
+    """Прирост RSS (МБ) над уровнем после прогрева — после каждой из sessions сессий."""
+    import utils
+    from pages import SECTIONS
+    modules = {m.rsplit(".", 1)[1]: m for m in SECTIONS.values()}
+    page = importlib.import_module(modules[section])
+    path = archive(size)
+    with tempfile.TemporaryDirectory(prefix="aeronav-bench-") as tmp:
+        utils.CACHE_DIR = os.path.join(tmp, "data_cache")
+        # прогрев: разбор архива в дисковый кэш, ленивые импорты и кэши страницы
+        page.run(utils.shared_view(utils.load_data(utils.LocalFile(path))))
+        gc.collect()
+        base = _rss()
+
+        held, growth = [], []
+        for _ in range(sessions):
+            df = utils.load_data(utils.LocalFile(path))
+            if copy:
+                # st.cache_data отдаёт каждому вызову копию из pickle
+                df = pickle.loads(pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL))
+            view = utils.shared_view(df)
+            page.run(view)
+            held.append(view)
+            gc.collect()
+            growth.append(round((_rss() - base) / 2 ** 20, 1))
+        return growth
+
+
+def main():
+    from pages import SECTIONS
+    names = [m.rsplit(".", 1)[1] for m in SECTIONS.values()]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1M")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--section", choices=names, default="main_charts")
+    parser.add_argument("--copy", action="store_true", help="копия набора на сессию, как у st.cache_data")
+    parser.add_argument("--json", default=None, help="куда сохранить результаты")
+    args = parser.parse_args()
+
+    # Streamlit в «голом» режиме предупреждает о каждом виджете
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+
+    growth = run(args.size, args.sessions, args.section, args.copy)
+    print(f"{'сессий':>8}{'прирост RSS, МБ':>18}")
+    for n, mb in enumerate(growth, 1):
+        print(f"{n:>8}{mb:>18.1f}")
+    per_session = (growth[-1] - growth[0]) / max(len(growth) - 1, 1)
+    print(f"\nв среднем на сессию: {per_session:.1f} МБ")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"size": args.size, "section": args.section, "copy": args.copy,
+                       "growth_mb": growth, "per_session_mb": round(per_session, 2)}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+﻿"""
+Холодный старт дашборда: время импорта и память (RSS) по разделам.
+
+Каждое измерение — в новом процессе интерпретатора: сначала выполняются
+импорты верхнего уровня app.py (оболочка: streamlit, utils, analytics,
+pages, PIL — ровно то, что импортирует app.py), затем модуль раздела.
+Строка «все разделы» — прежнее поведение app.py, импортировавшего все
+страницы сразу. Время — минимум по --repeat запускам, RSS — пиковый.
+
+Запуск из корня репозитория:
+    python -m bench.startup --repeat 3
+    python -m bench.startup --budget 5.0   # код выхода 1, если раздел грузится дольше 5 с
+"""
+import argparse, ast, json, os, subprocess, sys
+from pages import SECTIONS
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# Код, выполняемый в дочернем процессе: argv[1] — импорты оболочки, дальше
+# модули разделов; печатает одну строку JSON
+_PROBE = """
+import importlib, json, resource, sys, time
+t0 = time.perf_counter()
+exec(sys.argv[1], {})
+t1 = time.perf_counter()
+for name in sys.argv[2:]:
+    importlib.import_module(name)
+t2 = time.perf_counter()
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+rss *= 1 if sys.platform == "darwin" else 1024
+print(json.dumps({"shell_s": t1 - t0, "section_s": t2 - t1, "rss": rss, "modules": len(sys.modules)}))
+"""
+
+
+def shell_imports(path: str = APP_PATH) -> str:
+    """Импорты верхнего уровня app.py одним фрагментом кода — без запуска самого приложения."""
+    with open(path, encoding="utf-8-sig") as f:
+        tree = ast.parse(f.read())
+    return "\n".join(ast.unparse(node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom)))
+
+
+def probe(modules) -> dict:
+    out = subprocess.run([sys.executable, "-c", _PROBE, shell_imports(), *modules],
+                         cwd=os.path.dirname(APP_PATH), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def measure(modules, repeat: int = 1) -> dict:
+    runs = [probe(modules) for _ in range(repeat)]
+    return {
+        "shell_s": min(r["shell_s"] for r in runs),
+        "section_s": min(r["section_s"] for r in runs),
+        "rss": max(r["rss"] for r in runs),
+        "modules": runs[-1]["modules"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--budget", type=float, default=None,
+                        help="предел времени импорта раздела, с; превышение — код выхода 1")
+    parser.add_argument("--json", default=None, help="куда сохранить результаты")
+    args = parser.parse_args()
+
+    cases = {"оболочка": []}
+    cases.update({label: [module] for label, module in SECTIONS.items()})
+    cases["все разделы"] = list(SECTIONS.values())
+
+    results = {}
+    print(f"{'раздел':<28}{'оболочка, с':>12}{'раздел, с':>11}{'RSS, МБ':>10}{'модулей':>9}")
+    for label, modules in cases.items():
+        r = results[label] = measure(modules, args.repeat)
+        print(f"{label:<28}{r['shell_s']:>12.2f}{r['section_s']:>11.2f}"
+              f"{r['rss'] / 2**20:>10.0f}{r['modules']:>9}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.budget is not None:
+        slow = [label for label in SECTIONS if results[label]["section_s"] > args.budget]
+        if slow:
+            print(f"Дольше {args.budget} с: {', '.join(slow)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+﻿"""
+Сквозной бенчмарк: время и пиковая память загрузки архива и расчётов каждой
+страницы дашборда на синтетических архивах (bench.synth) разного размера,
+со сравнением с сохранёнными базовыми значениями (bench/baselines.json).
+
+Этапы для каждого размера:
+- ingest_cold — load_data без дискового кэша (разбор CSV и нормализация);
+- ingest_warm — load_data из дискового кэша (memory map);
+- <раздел> — run(df) страницы в «голом» режиме Streamlit (виджеты возвращают
+  значения по умолчанию) с очищенными кэшами Streamlit и пустыми каталогами
+  model_cache / reports: первый заход пользователя на страницу.
+
+Память — прирост пикового RSS процесса над уровнем до этапа (опрос
+/proc/self/statm, см. analytics.diagnostics.PeakRSS), время — минимум по --repeat.
+Регрессия — время больше базового в (1 + --tolerance) раз или память
+больше в (1 + --mem-tolerance) раз: таблица помечает этап, код выхода 1.
+
+Запуск из корня репозитория:
+    python -m bench.suite                       # 100k и 1M строк
+    python -m bench.suite --sizes 100k 10M --sections main_charts anomalies
+    python -m bench.suite --update-baseline     # записать текущие значения как базовые
+"""
+import argparse, importlib, json, logging, os, sys, tempfile, time, warnings
+from analytics.diagnostics import PeakRSS
+from bench.synth import generate, parse_rows
+
+# Архивы генератора (создаются при первом запуске, в git не попадают)
+BENCH_DATA_DIR = os.environ.get("AERONAV_BENCH_DIR", "bench_data")
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_SIZES = ("100k", "1M")
+# Разница меньше этих значений — шум замера, а не регрессия
+MIN_SECONDS = 0.05
+MIN_MB = 16.0
+
+
+def archive(size: str) -> str:
+    """Путь к синтетическому архиву на size строк (генерируется при отсутствии)."""
+    os.makedirs(BENCH_DATA_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DATA_DIR, f"synth-{size}.zip")
+    if not os.path.exists(path):
+        print(f"генерирую {path}…", file=sys.stderr)
+        generate(path + ".tmp", parse_rows(size))
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def _clear_streamlit_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def _measure(fn, repeat: int, setup=None) -> dict:
+    best_s, peak = None, None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        with PeakRSS() as mem:
+            t = time.perf_counter()
+            out = fn()
+            dt = time.perf_counter() - t
+        best_s = dt if best_s is None else min(best_s, dt)
+        if mem.delta is not None:
+            peak = mem.delta if peak is None else max(peak, mem.delta)
+    return {"seconds": round(best_s, 4), "peak_mb": None if peak is None else round(peak / 2 ** 20, 1)}, out
+
+
+def run_size(size: str, sections, repeat: int) -> dict:
+    """Замеры всех этапов для архива size; каталоги кэшей — временные."""
+    import utils
+    import analytics.artifacts, analytics.forecast
+    from pages import SECTIONS
+    path = archive(size)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="aeronav-bench-") as tmp:
+        utils.CACHE_DIR = os.path.join(tmp, "data_cache")
+        analytics.forecast.MODEL_CACHE_DIR = os.path.join(tmp, "model_cache")
+        analytics.artifacts.REPORT_DIR = os.path.join(tmp, "reports")
+
+        def cold():
+            _clear_streamlit_caches()
+            for name in os.listdir(utils.CACHE_DIR) if os.path.isdir(utils.CACHE_DIR) else ():
+                os.remove(os.path.join(utils.CACHE_DIR, name))
+
+        load = lambda: utils.load_data(utils.LocalFile(path))
+        results["ingest_cold"], _ = _measure(load, repeat, setup=cold)
+        results["ingest_warm"], df = _measure(load, repeat, setup=_clear_streamlit_caches)
+
+        modules = {m.rsplit(".", 1)[1]: m for m in SECTIONS.values()}
+        pages = {name: importlib.import_module(modules[name]) for name in sections}
+        # прогрев на начале архива: ленивые импорты (plotly, Stan) не попадают в замер
+        head = df.iloc[:50_000].copy()
+        for page in pages.values():
+            page.run(head)
+        for name, page in pages.items():
+
+            def fresh():
+                _clear_streamlit_caches()
+                for d in (analytics.forecast.MODEL_CACHE_DIR, analytics.artifacts.REPORT_DIR):
+                    if os.path.isdir(d):
+                        for f in os.listdir(d):
+                            os.remove(os.path.join(d, f))
+
+            results[name], _ = _measure(lambda: page.run(df), repeat, setup=fresh)
+        results["rows"] = len(df)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float, mem_tolerance: float) -> list:
+    """Список регрессий: (размер, этап, метрика, текущее, базовое)."""
+    failed = []
+    for size, stages in results.items():
+        for stage, cur in stages.items():
+            base = baseline.get(size, {}).get(stage)
+            if not isinstance(cur, dict) or not base:
+                continue
+            if cur["seconds"] > max(base["seconds"] * (1 + tolerance), base["seconds"] + MIN_SECONDS):
+                failed.append((size, stage, "seconds", cur["seconds"], base["seconds"]))
+            if cur["peak_mb"] is not None and base.get("peak_mb") is not None \
+                    and cur["peak_mb"] > max(base["peak_mb"] * (1 + mem_tolerance), base["peak_mb"] + MIN_MB):
+                failed.append((size, stage, "peak_mb", cur["peak_mb"], base["peak_mb"]))
+    return failed
+
+
+def main():
+    from pages import SECTIONS
+    names = [m.rsplit(".", 1)[1] for m in SECTIONS.values()]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--sections", nargs="+", choices=names, default=names)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--tolerance", type=float, default=0.5, help="допустимый рост времени (0.5 = +50%%)")
+    parser.add_argument("--mem-tolerance", type=float, default=0.5, help="допустимый рост памяти")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--json", default=None, help="куда сохранить результаты")
+    args = parser.parse_args()
+
+    # Streamlit в «голом» режиме предупреждает о каждом виджете, cmdstanpy — о запусках Stan
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+
+    try:
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            baseline = json.load(f)
+    except (OSError, ValueError):
+        baseline = {}
+
+    results = {size: run_size(size, args.sections, args.repeat) for size in args.sizes}
+
+    failed = compare(results, baseline, args.tolerance, args.mem_tolerance)
+    flagged = {(size, stage) for size, stage, *_ in failed}
+    print(f"{'размер':<8}{'этап':<22}{'время, с':>10}{'база, с':>10}{'память, МБ':>12}{'база, МБ':>10}")
+    for size, stages in results.items():
+        for stage, cur in stages.items():
+            if not isinstance(cur, dict):
+                continue
+            base = baseline.get(size, {}).get(stage) or {}
+            fmt = lambda v, spec: format(v, spec) if v is not None else format("—", spec[:-3])
+            mark = "  <<< РЕГРЕССИЯ" if (size, stage) in flagged else ""
+            print(f"{size:<8}{stage:<22}{fmt(cur['seconds'], '>10.3f')}{fmt(base.get('seconds'), '>10.3f')}"
+                  f"{fmt(cur['peak_mb'], '>12.1f')}{fmt(base.get('peak_mb'), '>10.1f')}{mark}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        print(f"базовые значения записаны в {BASELINE_PATH}")
+    elif failed:
+        print(f"\nРЕГРЕССИЯ производительности ({len(failed)}):", file=sys.stderr)
+        for size, stage, metric, cur, base in failed:
+            print(f"  {size} {stage}: {metric} {cur} против {base}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+﻿"""
+Генератор синтетических выгрузок в формате, который читает utils.load_data:
+ZIP с CSV (cp1251, разделитель «;», колонки SOURCE_COLUMNS, даты ДД.ММ.ГГГГ).
+
+Данные похожи на реальные: авиакомпании с разным числом рейсов, у рейса свой
+аэропорт, договор и базовая загрузка (у популярных рейсов больше строк),
+годовая и недельная сезонность, шум, редкие всплески и провалы, пустые
+договоры. Архив пишется потоково, блоками по CHUNK_ROWS строк, так что
+объём памяти не зависит от размера — от 100 тыс. до 100 млн строк.
+
+Запуск из корня репозитория:
+    python -m bench.synth data.zip --rows 1M
+    python -m bench.synth big.zip --rows 100M --files 60
+"""
+import argparse, io, zipfile
+import numpy as np
+import pandas as pd
+from utils import SOURCE_COLUMNS
+
+# Строк в одном блоке записи
+CHUNK_ROWS = 1_000_000
+# Доля строк с аномальной загрузкой (всплеск ×2..4 или провал до 0..30%)
+ANOMALY_SHARE = 0.001
+# Доля строк с пустым договором
+EMPTY_CONTRACT_SHARE = 0.02
+
+
+def parse_rows(text: str) -> int:
+    """'100k', '2.5M', '100000' -> число строк."""
+    text = text.strip().lower().replace("_", "")
+    scale = {"k": 10 ** 3, "m": 10 ** 6, "g": 10 ** 9}.get(text[-1:], 1)
+    return int(float(text[:-1] if scale > 1 else text) * scale)
+
+
+def _routes(rng: np.random.Generator, airlines: int, flights: int, airports: int, contracts: int) -> pd.DataFrame:
+    """Справочник рейсов: авиакомпания, аэропорт, договор, базовая загрузка, вес (частота)."""
+    letters = list("АБВГДЕЖИКЛМНОПРСТУФХЦЧШЭЮЯ")
+    pairs = [a + b for a in letters for b in letters]
+    codes = [pairs[i] for i in rng.choice(len(pairs), airlines, replace=False)]
+    ap_codes = [pairs[i] + letters[j] for i, j in zip(rng.choice(len(pairs), airports, replace=False),
+                                                      rng.integers(0, len(letters), airports))]
+    contract_names = np.array(
+        [f"Д-{rng.integers(1, 999)}/{i} от {rng.integers(1, 28):02d}.{rng.integers(1, 12):02d}.20{rng.integers(10, 24)}"
+         if i % 3 else f"К{rng.integers(10, 99)} прочее {i}" for i in range(contracts)])
+    airline = np.sort(rng.zipf(1.6, flights) % airlines)
+    number = np.array([f"{codes[a]}{100 + i}" for i, a in enumerate(airline)])
+    return pd.DataFrame({
+        "airline": np.array(codes)[airline],
+        "airport": np.array(ap_codes)[rng.zipf(1.4, flights) % airports],
+        "flight_no": number,
+        "contract": contract_names[rng.integers(0, contracts, flights)],
+        "base": rng.lognormal(4.3, 0.6, flights),
+        "season": rng.uniform(0.05, 0.35, flights),
+        "weight": rng.pareto(1.2, flights) + 1,
+    })
+
+
+def _chunk(rng: np.random.Generator, routes: pd.DataFrame, days: pd.DatetimeIndex, day_names: np.ndarray,
+           n: int) -> pd.DataFrame:
+    p = routes["weight"].to_numpy() / routes["weight"].sum()
+    r = rng.choice(len(routes), n, p=p)
+    d = rng.integers(0, len(days), n)
+    month = days.month.to_numpy()[d]
+    dow = days.dayofweek.to_numpy()[d]
+    season = routes["season"].to_numpy()[r]
+    load = (routes["base"].to_numpy()[r]
+            * (1 + season * np.sin(2 * np.pi * (month - 4) / 12))
+            * np.where(dow >= 5, 0.85, 1.0)
+            * rng.normal(1, 0.12, n))
+    anomaly = rng.random(n) < ANOMALY_SHARE
+    load[anomaly] *= np.where(rng.random(anomaly.sum()) < 0.5, rng.uniform(2, 4, anomaly.sum()),
+                              rng.uniform(0, 0.3, anomaly.sum()))
+    contract = routes["contract"].to_numpy()[r].astype(object)
+    contract[rng.random(n) < EMPTY_CONTRACT_SHARE] = ""
+    return pd.DataFrame(dict(zip(SOURCE_COLUMNS, (
+        routes["airline"].to_numpy()[r],
+        routes["airport"].to_numpy()[r],
+        routes["flight_no"].to_numpy()[r],
+        pd.Categorical.from_codes(d, day_names),
+        np.clip(np.rint(load), 0, None).astype(np.int64),
+        contract,
+    ))))
+
+
+def generate(path: str, rows: int, files: int = 12, start: str = "2019-01-01", years: int = 5,
+             airlines: int = 25, flights: int = 2000, airports: int = 80, contracts: int = 300,
+             seed: int = 42) -> str:
+    """
+    Пишет ZIP с rows строками в files CSV; каждый файл — свой отрезок периода
+    (как помесячные выгрузки). Возвращает path.
+    """
+    rng = np.random.default_rng(seed)
+    routes = _routes(rng, airlines, flights, airports, contracts)
+    all_days = pd.date_range(start, periods=365 * years, freq="D")
+    edges = np.linspace(0, len(all_days), files + 1).astype(int)
+    per_file = np.diff(np.linspace(0, rows, files + 1).astype(np.int64))
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1) as z:
+        for f in range(files):
+            days = all_days[edges[f]:edges[f + 1]]
+            day_names = np.asarray(days.strftime("%d.%m.%Y"))
+            with z.open(f"export_{f + 1:03d}.csv", "w", force_zip64=True) as out:
+                header = True
+                for lo in range(0, per_file[f], CHUNK_ROWS):
+                    n = min(CHUNK_ROWS, per_file[f] - lo)
+                    buf = io.StringIO()
+                    _chunk(rng, routes, days, day_names, n).to_csv(buf, sep=";", index=False, header=header)
+                    out.write(buf.getvalue().encode("cp1251"))
+                    header = False
+                if header:  # пустой файл — только заголовок
+                    out.write((";".join(SOURCE_COLUMNS) + "\n").encode("cp1251"))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=parse_rows, default=parse_rows("1M"), help="например 100k, 10M")
+    parser.add_argument("--files", type=int, default=12)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--flights", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    generate(args.path, args.rows, args.files, years=args.years, flights=args.flights, seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,10 @@
-﻿
\ No newline at end of file
+﻿# Разделы отчёта: подпись в меню -> модуль страницы с функцией run(df).
+# Модули импортируются только при выборе раздела (см. app.py): Prophet,
+# scikit-learn и прочие тяжёлые зависимости не грузятся, пока не нужны.
+SECTIONS = {
+    "Основные диаграммы": "pages.main_charts",
+    "Дополнительная аналитика": "pages.additional_analytics",
+    "Прогноз": "pages.forecast",
+    "Кластеры": "pages.clustering",
+    "Аномалии": "pages.anomalies",
+}
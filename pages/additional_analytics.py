@@ -1,8 +1,10 @@
 ﻿import streamlit as st
 import pandas as pd
 import plotly.express as px
-import seaborn as sns
-import matplotlib.pyplot as plt
+from analytics.charts import line, month_dow_heatmap
+from analytics.cube import get_cube
+from analytics.diagnostics import plotly_chart, stage
+from utils import date_bounds
 
 
 def run(df: pd.DataFrame):
@@ -29,27 +31,33 @@ def run(df: pd.DataFrame):
     )
 
     # Выбор периода одним разом
+    first, last = date_bounds(df)
     c1, c2 = st.columns(2)
     with c1:
-        start = st.date_input("Дата начала отчёта", df.dep_date.min(), key="aa_start")
+        start = st.date_input("Дата начала отчёта", first, key="aa_start")
     with c2:
-        end = st.date_input("Дата окончания отчёта", df.dep_date.max(), key="aa_end")
+        end = st.date_input("Дата окончания отчёта", last, key="aa_end")
 
-    df_f = df[(df.dep_date >= pd.to_datetime(start)) & (df.dep_date <= pd.to_datetime(end))]
-    if df_f.empty:
+    # все агрегаты — из дневного куба, без прохода по исходным строкам
+    with stage("cube", cached=True):
+        cube = get_cube(df)
+    if cube.total(start, end)["flights"] == 0:
         st.warning("Нет данных за выбранный период")
         return
 
+    # помесячные суммы — один запрос к кубу на оба графика
+    with stage("monthly"):
+        monthly = cube.monthly(start, end)
+
     # 1) Рейсы по месяцам
     with st.expander("1. Количество уникальных рейсов по месяцам", expanded=True):
-        df_f["month"] = df_f.dep_date.dt.to_period("M").astype(str)
-        flights = df_f.groupby("month")["flight_no"].nunique().reset_index(name="count")
-        fig1 = px.line(
+        flights = monthly.rename(columns={"flights": "count"})
+        fig1 = line(
             flights, x="month", y="count", markers=True,
             title="🛫 Число рейсов в месяц",
             labels={"month": "Месяц", "count": "Уникальных рейсов"}
         )
-        st.plotly_chart(fig1, use_container_width=True)
+        plotly_chart(fig1, use_container_width=True)
         st.markdown(
             "🔍 **Пояснение:** пики показывают, когда нужна максимальная загрузка флота и экипажа. "
             "Падения — время для профилактики и обучения персонала."
@@ -57,14 +65,12 @@ def run(df: pd.DataFrame):
 
     # 2) Пассажиропоток по месяцам
     with st.expander("2. Пассажиры по месяцам", expanded=False):
-        df_f["month"] = df_f.dep_date.dt.to_period("M").astype(str)
-        pax = df_f.groupby("month")["passengers"].sum().reset_index()
-        fig2 = px.line(
-            pax, x="month", y="passengers", markers=True,
+        fig2 = line(
+            monthly, x="month", y="passengers", markers=True,
             title="👥 Пассажиропоток в месяц",
             labels={"month": "Месяц", "passengers": "Пассажиров"}
         )
-        st.plotly_chart(fig2, use_container_width=True)
+        plotly_chart(fig2, use_container_width=True)
         st.markdown(
             "🔍 **Пояснение:** по месяцам видно, где основные доходы. "
             "Позволяет строить маркетинговые планы и менять цены."
@@ -72,14 +78,15 @@ def run(df: pd.DataFrame):
 
     # 3) Средняя загрузка рейсов
     with st.expander("3. Распределение средней загрузки рейсов", expanded=False):
-        avg = df_f.groupby("flight_no")["passengers"].mean().reset_index()
+        with stage("mean_load"):
+            avg = cube.mean_load(start, end)
         avg = avg[avg.passengers > 0]
         fig3 = px.histogram(
             avg, x="passengers", nbins=20,
             title="📈 Средняя загрузка по рейсам",
             labels={"passengers": "Среднее число пассажиров"}
         )
-        st.plotly_chart(fig3, use_container_width=True)
+        plotly_chart(fig3, use_container_width=True)
         st.markdown(
             "🔍 **Пояснение:** чем шире распределение — тем больше нерегулярные маршруты. "
             "Варианты: либо отказаться от нерентабельных, либо стимулировать их promos."
@@ -87,29 +94,10 @@ def run(df: pd.DataFrame):
 
     # 4) Тепловая карта «месяц-день недели»
     with st.expander("4. Тепловая карта «месяц / день недели»", expanded=False):
-        df_f["month_num"] = df_f.dep_date.dt.month
-        df_f["dow"] = df_f.dep_date.dt.dayofweek
-        month_map = {
-            i: m for i, m in enumerate(
-                ['Январь', 'Февраль', 'Март', 'Апрель', 'Май', 'Июнь',
-                 'Июль', 'Август', 'Сентябрь', 'Октябрь', 'Ноябрь', 'Декабрь'], 1)
-        }
-        day_map = {
-            i: d for i, d in enumerate(
-                ['Понедельник', 'Вторник', 'Среда', 'Четверг', 'Пятница', 'Суббота', 'Воскресенье'])
-        }
-        df_f['Месяц'] = df_f.month_num.map(month_map)
-        df_f['День недели'] = df_f.dow.map(day_map)
-
-        heat = df_f.groupby(['Месяц', 'День недели']).size().unstack(fill_value=0)
-        # рисуем
-        fig4, ax = plt.subplots(figsize=(12, 6))
-        sns.heatmap(
-            heat, cmap="YlOrRd", annot=True, fmt="d", linewidths=.5, ax=ax
-        )
-        ax.set_xlabel("День недели")
-        ax.set_ylabel("Месяц")
-        st.pyplot(fig4)
+        # матрица 12 × 7 из дневных сумм куба, фигура кэшируется по периоду
+        with stage("heatmap", cached=True):
+            fig4 = month_dow_heatmap(df, start, end)
+        plotly_chart(fig4, use_container_width=True)
         st.markdown(
             "🔍 **Пояснение:** горячие зоны — дни пиковых нагрузок. "
             "Полезно для планирования расписаний и смен на земле."
@@ -1,13 +1,16 @@
 ﻿import streamlit as st
+import numpy as np
 import pandas as pd
-import plotly.express as px
-from sklearn.ensemble import IsolationForest
-from sklearn.neighbors import LocalOutlierFactor
+from analytics.charts import scatter
+from analytics.diagnostics import plotly_chart, stage
+from utils import is_aggregated
+from analytics.anomalies import ROBUST_Z_THRESHOLD, cached_contextual_anomalies, cached_model_anomalies
 
 
 def run(df: pd.DataFrame):
     """
     Обнаружение аномалий:
+    • Контекстное: отклонение от сезонной базы своего рейса (медиана/MAD)
     • Пороговое (mean + 3·std)
     • IsolationForest
     • LocalOutlierFactor
@@ -20,40 +23,71 @@ def run(df: pd.DataFrame):
     st.markdown(
         """
         Разные методы показывают:
+        - Отклонения каждого рейса от его же обычной загрузки в этот день недели и месяц  
         - Критические выбросы по простому порогу  
         - Автоматические «странные точки» через IsolationForest и LOF  
         - Результаты можно сверить и выбрать надёжнее
         """
     )
 
+    if is_aggregated(df):
+        st.info(
+            "В потоковом режиме доступны только агрегаты: аномалии ищутся "
+            "по отдельным рейсам, поэтому раздел недоступен. Отключите потоковый режим."
+        )
+        return
+
     # Простое пороговое значение
     mean_p = df.passengers.mean()
     std_p = df.passengers.std()
     threshold = mean_p + 3 * std_p
     st.markdown(f"**Порог выбросов (mean + 3·std):** {threshold:.0f} пассажиров")
 
-    df["threshold_anomaly"] = df.passengers > threshold
+    # Графики — через analytics.charts: легенда до 10 рейсов + «Другие»,
+    # прореживание и WebGL на больших выборках
 
-    # IsolationForest
-    iso = IsolationForest(contamination=0.01, random_state=42)
-    df["iso_label"] = iso.fit_predict(df[["passengers"]])
-    df["iso_anomaly"] = df.iso_label == -1
+    # Контекстные аномалии, IsolationForest и LOF — один расчёт на архив;
+    # df общий для всех сессий, поэтому результаты не пишем в его колонки
+    key = df.attrs.get("dataset_key")
+    with stage("contextual_anomalies", rows=len(df), cached=True):
+        ctx = cached_contextual_anomalies(key, df)
+    with stage("model_anomalies", rows=len(df), cached=True):
+        found = cached_model_anomalies(key, df)
 
-    # LocalOutlierFactor
-    lof = LocalOutlierFactor(n_neighbors=20, contamination=0.01)
-    df["lof_label"] = lof.fit_predict(df[["passengers"]])
-    df["lof_anomaly"] = df.lof_label == -1
+    tabs = st.tabs(["По рейсу и сезону", "По порогу", "IsolationForest", "LocalOutlierFactor"])
 
-    tabs = st.tabs(["По порогу", "IsolationForest", "LocalOutlierFactor"])
+    # Контекстные: рейс × день недели × месяц
+    with tabs[0]:
+        st.markdown(
+            f"Строка — аномалия, если модифицированная z-оценка относительно медианы своего рейса "
+            f"в тот же день недели и месяц по модулю больше {ROBUST_Z_THRESHOLD}. "
+            f"Так видны и провалы на малых маршрутах, которые общий порог пропускает."
+        )
+        fig_ctx = scatter(
+            ctx, x="dep_date", y="passengers", color="flight_no",
+            title="Аномалии: отклонение от сезонной базы рейса"
+        )
+        plotly_chart(fig_ctx, use_container_width=True)
+        st.dataframe(
+            ctx.assign(direction=np.where(ctx.z > 0, "рост", "провал"))
+            .rename(columns={
+                "flight_no": "Рейс",
+                "dep_date": "Дата",
+                "passengers": "Пассажиров",
+                "baseline": "Обычно (медиана)",
+                "z": "z-оценка",
+                "direction": "Тип",
+            })
+        )
 
     # По порогу
-    with tabs[0]:
-        an = df[df.threshold_anomaly]
-        fig0 = px.scatter(
+    with tabs[1]:
+        an = df[df.passengers > threshold]
+        fig0 = scatter(
             an, x="dep_date", y="passengers", color="flight_no",
             title="Аномалии: порог (> mean+3·std)"
         )
-        st.plotly_chart(fig0, use_container_width=True)
+        plotly_chart(fig0, use_container_width=True)
         st.dataframe(
             an[["flight_no", "dep_date", "passengers"]]
             .rename(columns={
@@ -64,13 +98,13 @@ def run(df: pd.DataFrame):
         )
 
     # IsolationForest
-    with tabs[1]:
-        an_iso = df[df.iso_anomaly]
-        fig1 = px.scatter(
+    with tabs[2]:
+        an_iso = df.iloc[found["iso"]]
+        fig1 = scatter(
             an_iso, x="dep_date", y="passengers", color="flight_no",
             title="Аномалии: IsolationForest"
         )
-        st.plotly_chart(fig1, use_container_width=True)
+        plotly_chart(fig1, use_container_width=True)
         st.dataframe(
             an_iso[["flight_no", "dep_date", "passengers"]]
             .rename(columns={"flight_no": "Рейс", "dep_date": "Дата", "passengers": "Пассажиров"})
@@ -78,13 +112,13 @@ def run(df: pd.DataFrame):
         )
 
     # LOF
-    with tabs[2]:
-        an_lof = df[df.lof_anomaly]
-        fig2 = px.scatter(
+    with tabs[3]:
+        an_lof = df.iloc[found["lof"]]
+        fig2 = scatter(
             an_lof, x="dep_date", y="passengers", color="flight_no",
             title="Аномалии: LocalOutlierFactor"
         )
-        st.plotly_chart(fig2, use_container_width=True)
+        plotly_chart(fig2, use_container_width=True)
         st.dataframe(
             an_lof[["flight_no", "dep_date", "passengers"]]
             .rename(columns={"flight_no": "Рейс", "dep_date": "Дата", "passengers": "Пассажиров"})
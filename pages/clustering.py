@@ -1,8 +1,8 @@
 ﻿import streamlit as st
 import pandas as pd
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-import plotly.express as px
+from analytics.charts import scatter
+from analytics.diagnostics import plotly_chart, stage
+from analytics.clustering import ROUTE_FEATURES, cached_route_profiles, cluster_routes, kmeans_1d, mean_load
 
 
 def run(df: pd.DataFrame):
@@ -14,8 +14,20 @@ def run(df: pd.DataFrame):
     - Определить маршруты для стимулирования (низкая)
     - Выделить «локомотивы» (средняя)
     - Анализировать перегруз (высокая)
+
+    Второй режим — кластеры по профилю маршрута (загрузка, волатильность,
+    сезонность, частота).
     """
     st.header("🗂 Кластеризация маршрутов по средней загрузке")
+    mode = st.radio(
+        "Режим",
+        ["По средней загрузке", "По профилю маршрута"],
+        horizontal=True,
+    )
+    if mode == "По профилю маршрута":
+        _route_profile_clusters(df)
+        return
+
     st.markdown(
         """
         Автоматическое разделение маршрутов на три группы:
@@ -25,33 +37,24 @@ def run(df: pd.DataFrame):
         """
     )
 
-    # Средняя загрузка по рейсам
-    agg = df.groupby("flight_no")["passengers"].mean().reset_index()
-    scaler = StandardScaler()
-    x = scaler.fit_transform(agg[["passengers"]])
-
-    # 3 кластера
-    kmeans = KMeans(n_clusters=3, random_state=42)
-    agg["cluster"] = kmeans.fit_predict(x)
+    # Средняя загрузка по рейсам (по строкам или по агрегатам потокового режима)
+    with stage("mean_load", rows=len(df)):
+        agg = mean_load(df)
 
-    # Центры
-    centers = scaler.inverse_transform(kmeans.cluster_centers_).flatten()
-    order = centers.argsort()
-    labels = {
-        order[0]: "Низкая загрузка",
-        order[1]: "Средняя загрузка",
-        order[2]: "Высокая загрузка",
-    }
-    agg["cluster_label"] = agg["cluster"].map(labels)
+    # 3 кластера: точная одномерная кластеризация, кластеры упорядочены по центрам
+    with stage("kmeans_1d", rows=len(agg)):
+        agg["cluster"], centers = kmeans_1d(agg["passengers"].to_numpy(), 3)
+    labels = ["Низкая загрузка", "Средняя загрузка", "Высокая загрузка"]
+    agg["cluster_label"] = agg["cluster"].map(dict(enumerate(labels)))
 
-    # Визуализация
-    fig = px.scatter(
-        agg, x="flight_no", y="passengers",
+    # Визуализация: рейсы по возрастанию загрузки, при большом числе — прореженно
+    fig = scatter(
+        agg.sort_values("passengers", kind="stable"), x="flight_no", y="passengers",
         color="cluster_label",
         title="Маршруты по уровню загрузки",
         labels={"cluster_label": "Группа", "passengers": "Средняя загрузка"}
     )
-    st.plotly_chart(fig, use_container_width=True)
+    plotly_chart(fig, use_container_width=True)
 
     # Печатаем центры кластера
     st.markdown("**Средние значения загрузки по группам:**")
@@ -65,4 +68,38 @@ def run(df: pd.DataFrame):
         2. Удерживайте "средние" кластеры стабильными.  
         3. Рассмотрите добавление рейсов для «Высокой загрузки».
         """
-    )
\ No newline at end of file
+    )
+
+
+def _route_profile_clusters(df: pd.DataFrame):
+    """Кластеры маршрутов по загрузке, волатильности, сезонности и частоте рейсов."""
+    st.markdown(
+        """
+        Маршруты группируются по четырём признакам: средняя загрузка,
+        волатильность (коэффициент вариации), сезонность (размах средних
+        по месяцам относительно средней) и частота рейсов в неделю.
+        """
+    )
+    k = st.slider("Число кластеров", 2, 8, 4)
+
+    with stage("route_profiles", rows=len(df), cached=True):
+        profiles = cached_route_profiles(df.attrs.get("dataset_key"), df)
+    if len(profiles) < k:
+        st.warning("Маршрутов меньше, чем кластеров.")
+        return
+    with stage("minibatch_kmeans", rows=len(profiles)):
+        profiles = profiles.assign(cluster=cluster_routes(profiles, k).astype(str))
+
+    fig = scatter(
+        profiles, x="mean_load", y="volatility",
+        color="cluster", size="frequency",
+        hover_data=["flight_no", "seasonality"],
+        title="Маршруты по профилю",
+        labels={"cluster": "Кластер", **ROUTE_FEATURES},
+    )
+    plotly_chart(fig, use_container_width=True)
+
+    # Средние значения признаков по кластерам
+    summary = profiles.groupby("cluster")[list(ROUTE_FEATURES)].mean()
+    summary.insert(0, "Маршрутов", profiles.groupby("cluster").size())
+    st.dataframe(summary.rename(columns=ROUTE_FEATURES).round(2), use_container_width=True)
@@ -1,7 +1,11 @@
 ﻿import streamlit as st
 import pandas as pd
-from prophet import Prophet
+import plotly.express as px
 from prophet.plot import plot_plotly
+from analytics.forecast import cached_forecast, monthly_history
+from analytics.segments import SEGMENT_DIMENSIONS, cached_segment_forecast
+from analytics.backtest import MIN_TRAIN_MONTHS, cached_backtest
+from analytics.diagnostics import plotly_chart, stage
 
 def run(df: pd.DataFrame):
     """
@@ -23,25 +27,21 @@ def run(df: pd.DataFrame):
     )
 
     # Подготовка исторических данных по месяцам
-    hist = df.groupby(df.dep_date.dt.to_period("M"))["passengers"] \
-        .sum().reset_index(name="y")
-    hist["ds"] = hist.dep_date.dt.to_timestamp()
+    with stage("monthly_history"):
+        hist = monthly_history(df)
 
-    # Обучаем модель
-    m = Prophet(yearly_seasonality=True, weekly_seasonality=False, daily_seasonality=False)
-    m.fit(hist[["ds", "y"]])
-
-    # Будущее на 6 месяцев
-    future = m.make_future_dataframe(periods=6, freq="M")
-    forecast = m.predict(future)
+    # Модель и прогноз на 6 месяцев: переобучение только при новой истории
+    with stage("prophet", rows=len(hist), cached=True):
+        m, forecast = cached_forecast(hist)
 
     # График
     fig1 = plot_plotly(m, forecast)
-    st.plotly_chart(fig1, use_container_width=True)
+    plotly_chart(fig1, use_container_width=True)
 
     # Компоненты (тренд + сезонность)
-    comp = m.plot_components(forecast)
-    st.pyplot(comp)
+    with stage("components"):
+        comp = m.plot_components(forecast)
+        st.pyplot(comp)
 
     # Таблица прогноза
     next6 = (forecast[["ds", "yhat"]]
@@ -58,6 +58,56 @@ def run(df: pd.DataFrame):
     st.markdown("**Прогноз по месяцам (неотрицательный):**")
     st.dataframe(next6.set_index("Месяц"))
 
+    # Точность прогноза: бэктест по скользящей точке отсчёта
+    with st.expander("Точность прогноза на истории (бэктест)", expanded=False):
+        if len(hist) <= MIN_TRAIN_MONTHS:
+            st.info(f"Для бэктеста нужно больше {MIN_TRAIN_MONTHS} месяцев истории.")
+        elif st.checkbox("Запустить бэктест", key="fc_backtest"):
+            with stage("backtest", rows=len(hist), cached=True):
+                metrics, _ = cached_backtest(hist)
+            mape = metrics.pivot(index="horizon", columns="model", values="mape")
+            mae = metrics.pivot(index="horizon", columns="model", values="mae")
+            fig_bt = px.line(
+                mape.reset_index().melt(id_vars="horizon", var_name="Модель", value_name="MAPE"),
+                x="horizon", y="MAPE", color="Модель", markers=True,
+                title="Ошибка прогноза (MAPE, %) по горизонту",
+                labels={"horizon": "Горизонт, мес."}
+            )
+            plotly_chart(fig_bt, use_container_width=True)
+            st.dataframe(pd.concat({"MAPE, %": mape.round(1), "MAE, пасс.": mae.round(0)}, axis=1))
+            best = mape.mean().idxmin()
+            st.markdown(
+                f"🔍 **Пояснение:** модель обучается на истории до каждого месяца и прогнозирует "
+                f"{len(mape)} мес. вперёд; ошибки усреднены по всем таким точкам. "
+                f"Наименьшая средняя MAPE — у модели **{best}**."
+            )
+
+    # Прогноз по сегментам: сотни рядов, поэтому только по запросу
+    st.subheader("Прогноз по авиакомпаниям, аэропортам, договорам и рейсам")
+    c1, c2 = st.columns(2)
+    with c1:
+        dim = st.selectbox("Разрез", list(SEGMENT_DIMENSIONS), format_func=SEGMENT_DIMENSIONS.get, key="fc_dim")
+    with c2:
+        fast = st.checkbox("Только быстрая модель (без Prophet)", key="fc_fast")
+    if st.checkbox("Рассчитать прогноз по всем сегментам", key="fc_segments"):
+        with stage(f"segments:{dim}", cached=True):
+            seg = cached_segment_forecast(df.attrs.get("dataset_key"), dim, fast, df)
+        table = seg.assign(ds=seg.ds.dt.strftime("%Y-%m")) \
+            .pivot(index="segment", columns="ds", values="yhat")
+        table.index.name = SEGMENT_DIMENSIONS[dim]
+        st.dataframe(table)
+        st.caption(
+            "Модели: " + ", ".join(f"{k} — {v}" for k, v in seg.groupby("model").segment.nunique().items())
+            + ". Prophet — для рядов с историей от двух лет, для коротких и разреженных — "
+              "сезонный наивный прогноз или экспоненциальное сглаживание."
+        )
+        st.download_button(
+            "Скачать прогноз (CSV)",
+            seg.to_csv(index=False).encode("utf-8-sig"),
+            file_name=f"forecast_{dim}.csv",
+            mime="text/csv",
+        )
+
     st.markdown(
         """
         **Как применять**:  
@@ -1,6 +1,9 @@
 ﻿import streamlit as st
 import pandas as pd
 import plotly.express as px
+from analytics.cube import get_cube
+from analytics.diagnostics import plotly_chart, stage
+from utils import date_bounds
 
 
 def run(df: pd.DataFrame):
@@ -29,16 +32,17 @@ def run(df: pd.DataFrame):
     )
 
     # Настройка дат
+    first, last = date_bounds(df)
     c1, c2 = st.columns(2)
     with c1:
-        start = st.date_input("Дата начала", df["dep_date"].min(), key="mc_start")
+        start = st.date_input("Дата начала", first, key="mc_start")
     with c2:
-        end = st.date_input("Дата окончания", df["dep_date"].max(), key="mc_end")
+        end = st.date_input("Дата окончания", last, key="mc_end")
 
-    mask = (df["dep_date"] >= pd.to_datetime(start)) & (df["dep_date"] <= pd.to_datetime(end))
-    df_f = df.loc[mask]
-
-    if df_f.empty:
+    # все агрегаты — из дневного куба, без прохода по исходным строкам
+    with stage("cube", cached=True):
+        cube = get_cube(df)
+    if cube.total(start, end)["flights"] == 0:
         st.warning("Нет данных за выбранный период")
         return
 
@@ -53,8 +57,8 @@ def run(df: pd.DataFrame):
     for title, col, kind in charts:
         st.subheader(title)
         # агрегируем
-        agg = df_f.groupby(col)["passengers"].sum().reset_index(name="value")
-        top5 = agg.nlargest(5, "value")
+        with stage(f"top:{col}"):
+            top5 = cube.top(col, start, end, 5)
         if kind == "pie":
             fig = px.pie(
                 top5, names=col, values="value", hole=0.3,
@@ -67,4 +71,4 @@ def run(df: pd.DataFrame):
                 title=title,
                 labels={"value": "Пассажиры", col: title}
             )
-        st.plotly_chart(fig, use_container_width=True)
\ No newline at end of file
+        plotly_chart(fig, use_container_width=True)
\ No newline at end of file
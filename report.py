@@ -0,0 +1,183 @@
+﻿"""
+Ночной отчёт без Streamlit: те же расчёты, что на страницах дашборда, для
+всего периода архива. Результаты — таблицы Parquet и manifest.json в
+<AERONAV_REPORT_DIR>/<dataset_key>/ (см. analytics.artifacts). Дашборд,
+открыв тот же архив, берёт аномалии, профили маршрутов и прогнозы по
+сегментам оттуда, а модели Prophet и бэктест — из model_cache, который
+отчёт тоже заполняет.
+
+Разделы считаются параллельно в пуле процессов; каждый процесс читает
+архив из дискового кэша utils.load_data (memory map), а не парсит CSV.
+--workers ограничивает все процессы отчёта: внутренние пулы разделов
+(Prophet по сегментам, бэктест) получают долю, оставшуюся на раздел.
+
+Запуск из корня репозитория:
+    python report.py data.zip
+    python report.py data.zip --sections top monthly heatmap --workers 2
+"""
+import argparse, logging, os, time, warnings
+
+if __name__ in ("__main__", "__mp_main__"):
+    # запуск из командной строки (и процессы пула): Streamlit вне сервера предупреждает
+    # об отсутствии runtime, cmdstanpy пишет о каждом запуске Stan — оставляем только ошибки
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from analytics.artifacts import REPORT_DIR, read_manifest, write_artifact, write_manifest
+from analytics.cube import DIMENSIONS, get_cube
+from analytics.parallel import pool_map
+from utils import LocalFile, load_data
+
+# Строк в таблицах «топ» (на страницах показывается топ-5)
+TOP_N = 20
+# Число кластеров профиля маршрута (как по умолчанию на странице)
+ROUTE_CLUSTERS = 4
+
+
+def _load(path: str) -> pd.DataFrame:
+    return load_data(LocalFile(path))
+
+
+def section_top(df: pd.DataFrame) -> dict:
+    cube = get_cube(df)
+    return {f"top_{dim}": cube.top(dim, cube.first_day, cube.last_day, TOP_N) for dim in DIMENSIONS}
+
+
+def section_monthly(df: pd.DataFrame) -> dict:
+    cube = get_cube(df)
+    return {
+        "monthly": cube.monthly(cube.first_day, cube.last_day),
+        "daily": cube.daily(cube.first_day, cube.last_day),
+        "mean_load": cube.mean_load(cube.first_day, cube.last_day),
+    }
+
+
+def section_heatmap(df: pd.DataFrame) -> dict:
+    from analytics.charts import MONTH_NAMES, WEEKDAY_NAMES
+    cube = get_cube(df)
+    counts = cube.month_dow_counts(cube.first_day, cube.last_day)
+    return {"heatmap": pd.DataFrame(counts, columns=WEEKDAY_NAMES).assign(month=MONTH_NAMES)}
+
+
+def section_clusters(df: pd.DataFrame) -> dict:
+    from analytics.clustering import cluster_routes, kmeans_1d, route_profiles
+    load = df.groupby("flight_no", observed=True)["passengers"].mean().reset_index()
+    load["cluster"], _ = kmeans_1d(load["passengers"].to_numpy(), 3)
+    profiles = route_profiles(df)
+    return {
+        "load_clusters": load,
+        "route_profiles": profiles,
+        "route_clusters": profiles[["flight_no"]].assign(cluster=cluster_routes(profiles, ROUTE_CLUSTERS)),
+    }
+
+
+def section_anomalies(df: pd.DataFrame) -> dict:
+    from analytics.anomalies import contextual_anomalies, model_anomalies
+    found = model_anomalies(df)
+    return {
+        "anomalies_contextual": contextual_anomalies(df),
+        "anomalies_model": pd.DataFrame({
+            "method": np.repeat(list(found), [len(v) for v in found.values()]),
+            "row": np.concatenate(list(found.values())).astype(np.int64),
+        }),
+    }
+
+
+def section_forecast(df: pd.DataFrame, fast_segments: bool = False, workers: int = None) -> dict:
+    from analytics.forecast import cached_forecast, monthly_history
+    from analytics.segments import SEGMENT_DIMENSIONS, segment_artifact, segment_forecast
+    _, forecast = cached_forecast(monthly_history(df))
+    out = {"forecast": forecast[["ds", "yhat", "yhat_lower", "yhat_upper"]]}
+    for dim in SEGMENT_DIMENSIONS:
+        out[segment_artifact(dim, fast_segments)] = segment_forecast(df, dim, fast_segments, workers=workers)
+    return out
+
+
+def section_backtest(df: pd.DataFrame, workers: int = None) -> dict:
+    from analytics.backtest import MIN_TRAIN_MONTHS, cached_backtest
+    from analytics.forecast import monthly_history
+    hist = monthly_history(df)
+    if len(hist) <= MIN_TRAIN_MONTHS:
+        return {}
+    metrics, predictions = cached_backtest(hist, workers=workers)
+    return {"backtest_metrics": metrics, "backtest_predictions": predictions}
+
+
+# Разделы отчёта в порядке запуска: самые долгие — первыми
+SECTIONS = {
+    "backtest": section_backtest,
+    "forecast": section_forecast,
+    "anomalies": section_anomalies,
+    "clusters": section_clusters,
+    "monthly": section_monthly,
+    "heatmap": section_heatmap,
+    "top": section_top,
+}
+
+
+def _run_section(path: str, name: str, fast_segments: bool, workers: int) -> dict:
+    """
+    Задача пула: считает раздел и пишет его таблицы. Возвращает {таблица: строк}
+    и время. workers — процессов на внутренние пулы раздела.
+    """
+    t = time.perf_counter()
+    df = _load(path)
+    fn = SECTIONS[name]
+    if name == "forecast":
+        tables = fn(df, fast_segments, workers)
+    elif name == "backtest":
+        tables = fn(df, workers)
+    else:
+        tables = fn(df)
+    key = df.attrs["dataset_key"]
+    for table, data in tables.items():
+        write_artifact(key, table, data)
+    return {"tables": {t: len(d) for t, d in tables.items()}, "seconds": round(time.perf_counter() - t, 3)}
+
+
+def run_report(path: str, sections=tuple(SECTIONS), workers: int = None, fast_segments: bool = False) -> dict:
+    """Считает разделы отчёта для архива path и возвращает manifest."""
+    t = time.perf_counter()
+    df = _load(path)  # первый разбор заполняет дисковый кэш для процессов пула
+    if df.empty:
+        raise ValueError(f"{path}: нет данных")
+    key = df.attrs["dataset_key"]
+    # процессы делятся между разделами: внешний пул × внутренние не больше workers
+    total = workers or os.cpu_count() or 1
+    inner = max(1, total // min(len(sections), total))
+    results = pool_map(_run_section, [(path, name, fast_segments, inner) for name in sections], workers)
+    # разделы прошлых запусков для того же архива остаются в manifest
+    manifest = read_manifest(key) or {"sections": {}}
+    manifest.update({
+        "dataset_key": key,
+        "source": path,
+        "rows": len(df),
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "seconds": round(time.perf_counter() - t, 3),
+    })
+    manifest["sections"].update(zip(sections, results))
+    write_manifest(key, manifest)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archive", help="ZIP-архив или CSV в формате выгрузки")
+    parser.add_argument("--sections", nargs="+", choices=list(SECTIONS), default=list(SECTIONS))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--fast-segments", action="store_true",
+                        help="прогноз по сегментам только быстрой моделью, без Prophet")
+    args = parser.parse_args()
+
+    manifest = run_report(args.archive, args.sections, args.workers, args.fast_segments)
+    print(f"{REPORT_DIR}/{manifest['dataset_key']}: {manifest['rows']} строк, {manifest['seconds']} с")
+    for name in args.sections:
+        r = manifest["sections"][name]
+        print(f"  {name:<10}{r['seconds']:>9.1f} с  {', '.join(r['tables']) or '—'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+﻿import os, sys
+
+# тесты запускаются из корня репозитория: модули приложения импортируются как в app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,53 @@
+﻿"""Потоковые агрегаты (utils.aggregate_archive) дают те же ответы, что и строки."""
+import io
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+from analytics.clustering import mean_load, route_profiles
+from analytics.cube import build_cube
+from analytics.forecast import monthly_history
+from bench.synth import generate
+
+START, END = "2020-02-10", "2021-03-17"  # неполные месяцы на обоих краях
+
+
+@pytest.fixture(scope="module")
+def data(tmp_path_factory):
+    path = generate(str(tmp_path_factory.mktemp("synth") / "synth.zip"), 20_000, files=3, years=3,
+                    flights=150, contracts=20)
+    raw = open(path, "rb").read()
+    rows = utils.parse_archive(raw, True).sort_values("dep_date", kind="stable", ignore_index=True)
+    # мелкие блоки и частая свёртка — как у архива больше памяти
+    block, compact = utils.STREAM_BLOCK_BYTES, utils.STREAM_COMPACT_ROWS
+    utils.STREAM_BLOCK_BYTES, utils.STREAM_COMPACT_ROWS = 64 * 1024, 2_000
+    try:
+        agg = utils.aggregate_archive(io.BytesIO(raw), True)
+    finally:
+        utils.STREAM_BLOCK_BYTES, utils.STREAM_COMPACT_ROWS = block, compact
+    return rows, agg
+
+
+def test_counts_are_int32(data):
+    _, agg = data
+    for name, table in agg.tables().items():
+        assert table["rows"].dtype == np.int32, name
+
+
+def test_cube(data):
+    rows, agg = data
+    a, b = build_cube(agg), build_cube(rows)
+    for field in ("daily_pax", "daily_flights", "month_offsets", "month_flights"):
+        assert np.array_equal(getattr(a, field), getattr(b, field)), field
+    for dim in ("airline", "airport", "contract_short"):
+        pd.testing.assert_frame_equal(a.top(dim, START, END, 10), b.top(dim, START, END, 10))
+    assert np.array_equal(a.month_dow_counts(START, END), b.month_dow_counts(START, END))
+    # рейсы в потоковом режиме — за целые месяцы, пересекающие период
+    pd.testing.assert_frame_equal(a.mean_load(START, END), b.mean_load("2020-02-01", "2021-03-31"))
+
+
+def test_clustering_and_history(data):
+    rows, agg = data
+    pd.testing.assert_frame_equal(route_profiles(agg), route_profiles(rows), check_exact=False, rtol=1e-9)
+    pd.testing.assert_frame_equal(mean_load(agg), mean_load(rows[rows.dep_date.notna()]), check_exact=False)
+    pd.testing.assert_frame_equal(monthly_history(agg), monthly_history(rows), check_dtype=False)
@@ -0,0 +1,79 @@
+﻿"""contextual_scores: выброс в контексте, нулевой MAD и возврат к базе всего рейса."""
+import numpy as np
+import pandas as pd
+from analytics.anomalies import MIN_CONTEXT_ROWS, ROBUST_Z_THRESHOLD, contextual_scores
+
+
+def _frame(flight, dates, passengers) -> pd.DataFrame:
+    return pd.DataFrame({
+        "flight_no": pd.Categorical(flight),
+        "dep_date": pd.to_datetime(dates),
+        "passengers": np.asarray(passengers, dtype=np.int16),
+    })
+
+
+def _seasonal(seed: int) -> pd.DataFrame:
+    """Один рейс ежедневно за 10 лет: зимой ~100 пассажиров, летом ~300."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2014-01-01", "2023-12-31")
+    base = np.where(dates.month.isin([6, 7, 8]), 300, 100)
+    return _frame(["F1"] * len(dates), dates, base + rng.integers(-10, 11, len(dates)))
+
+
+def test_planted_outlier_flagged_in_context():
+    df = _seasonal(1)
+    # летняя загрузка в январский понедельник: обычна для рейса в целом, но не для контекста
+    row = df.index[(df.dep_date == "2019-01-07")][0]
+    df.loc[row, "passengers"] = 300
+    scores = contextual_scores(df)
+    assert scores.loc[row, "anomaly"] and scores.loc[row, "z"] > ROBUST_Z_THRESHOLD
+    assert 90 <= scores.loc[row, "baseline"] <= 110
+    assert scores["anomaly"].sum() == 1
+    # те же 300 пассажиров летом — норма
+    summer = df.index[df.dep_date == "2019-07-08"][0]
+    df.loc[summer, "passengers"] = 300
+    assert not contextual_scores(df).loc[summer, "anomaly"]
+
+
+def test_zero_mad_context():
+    # январские понедельники за 10 лет — один контекст из ~40 строк
+    dates = pd.date_range("2010-01-01", "2019-12-31")
+    dates = dates[(dates.month == 1) & (dates.dayofweek == 0)]
+    passengers = np.full(len(dates), 120)
+    df = _frame(["F1"] * len(dates), dates, passengers)
+    assert len(df) >= MIN_CONTEXT_ROWS
+    scores = contextual_scores(df)
+    # постоянный контекст: MAD = 0 и среднее отклонение = 0, деления на ноль нет
+    assert np.all(scores["z"] == 0) and not scores["anomaly"].any()
+
+    df.loc[0, "passengers"] = 180
+    scores = contextual_scores(df)
+    # MAD = 0, знаменатель — 1.2533 · среднее абсолютное отклонение
+    assert np.isfinite(scores["z"]).all()
+    assert scores.loc[0, "anomaly"] and not scores["anomaly"].iloc[1:].any()
+    np.testing.assert_allclose(scores.loc[0, "z"], 60 / (1.2533 * 60 / len(df)))
+
+
+def test_small_context_falls_back_to_flight():
+    df = _seasonal(2)
+    # второй рейс: по одной строке в контексте — база и разброс берутся по всему рейсу
+    dates = pd.date_range("2020-01-01", periods=60, freq="5D")
+    rng = np.random.default_rng(3)
+    other = _frame(["F2"] * len(dates), dates, 50 + rng.integers(-5, 6, len(dates)))
+    df = pd.concat([df, other], ignore_index=True)
+    df["flight_no"] = df["flight_no"].astype("category")
+    rows = df.index[df.flight_no == "F2"]
+    scores = contextual_scores(df).loc[rows]
+    x = df.loc[rows, "passengers"].astype(np.float64)
+    median = x.median()
+    mad = (x - median).abs().median()
+    np.testing.assert_allclose(scores["baseline"], median)
+    np.testing.assert_allclose(scores["z"], 0.6745 * (x - median) / mad)
+
+
+def test_rows_without_date_or_flight():
+    df = _seasonal(4).head(40)
+    df.loc[3, "dep_date"] = pd.NaT
+    df.loc[5, "flight_no"] = np.nan
+    scores = contextual_scores(df)
+    assert scores["z"].isna().sum() == 2 and not scores.loc[[3, 5], "anomaly"].any()
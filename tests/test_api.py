@@ -0,0 +1,47 @@
+﻿"""Кэш ответов API: ключ из проверенных параметров и ограничение по байтам."""
+import numpy as np
+import pandas as pd
+import pytest
+from cachetools import TTLCache
+from fastapi.testclient import TestClient
+import api
+from analytics.cube import DIMENSIONS
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Клиент без lifespan: данные подставляются напрямую, кэш — пустой."""
+    rng = np.random.default_rng(3)
+    n = 2000
+    df = pd.DataFrame({
+        **{dim: pd.Categorical(rng.choice([f"{dim[0]}{i}" for i in range(40)], n)) for dim in DIMENSIONS},
+        "dep_date": pd.Timestamp("2021-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 400, n)), unit="D"),
+        "passengers": rng.integers(0, 300, n).astype(np.int16),
+    })
+    monkeypatch.setitem(api._state, "df", df)
+    monkeypatch.setattr(api, "_responses", TTLCache(maxsize=api.API_CACHE_BYTES, ttl=60, getsizeof=len))
+    return TestClient(api.app)
+
+
+def test_equivalent_queries_share_entry(client):
+    first = client.get("/top/airline?n=10&start=2021-02-01")
+    assert first.status_code == 200 and len(first.json()) == 10
+    for query in ("n=010&start=2021-02-01", "start=2021-02-01&n=10", "n=10&n=10&start=2021-02-01"):
+        again = client.get(f"/top/airline?{query}")
+        assert again.status_code == 200 and again.content == first.content
+    assert len(api._responses) == 1
+
+
+def test_cache_bounded_by_bytes(client, monkeypatch):
+    size = len(client.get("/top/airline?n=40").content)
+    monkeypatch.setattr(api, "_responses", TTLCache(maxsize=3 * size, ttl=60, getsizeof=len))
+    for n in range(35, 41):
+        assert client.get(f"/top/airline?n={n}").status_code == 200
+    assert 0 < api._responses.currsize <= 3 * size
+    assert ("top", "airline", None, None, 40) in api._responses
+
+
+def test_oversized_body_not_cached(client, monkeypatch):
+    monkeypatch.setattr(api, "_responses", TTLCache(maxsize=10, ttl=60, getsizeof=len))
+    assert client.get("/monthly").status_code == 200
+    assert len(api._responses) == 0
@@ -0,0 +1,40 @@
+﻿"""Таблицы ночного отчёта: версия расчёта в имени файла."""
+import pandas as pd
+import pytest
+from analytics import artifacts
+
+
+@pytest.fixture(autouse=True)
+def report_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(artifacts, "REPORT_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_roundtrip():
+    df = pd.DataFrame({"a": [1, 2]})
+    artifacts.write_artifact("k", "t", df)
+    pd.testing.assert_frame_equal(artifacts.read_artifact("k", "t"), df)
+    assert artifacts.read_artifact("k", "other") is None
+    assert artifacts.read_artifact(None, "t") is None
+
+
+def test_version_mismatch_is_not_read(monkeypatch, report_dir):
+    artifacts.write_artifact("k", "t", pd.DataFrame({"a": [1]}))
+    monkeypatch.setitem(artifacts.ARTIFACT_VERSIONS, "t", 2)
+    assert artifacts.read_artifact("k", "t") is None
+    # таблица без версии в имени (прежний формат) тоже не читается
+    pd.DataFrame({"a": [1]}).to_parquet(report_dir / "k" / "route_profiles.parquet")
+    assert artifacts.read_artifact("k", "route_profiles") is None
+
+
+def test_cached_artifact():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return "computed"
+
+    assert artifacts.cached_artifact("k", "t", compute) == "computed"
+    artifacts.write_artifact("k", "t", pd.DataFrame({"a": [1, 2]}))
+    assert artifacts.cached_artifact("k", "t", compute, load=lambda t: t["a"].sum()) == 3
+    assert len(calls) == 1
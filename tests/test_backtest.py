@@ -0,0 +1,23 @@
+﻿"""Бэктест: календарные горизонты и каталог кэша."""
+import os
+import numpy as np
+import pandas as pd
+from analytics import backtest, forecast
+
+
+def test_cache_dir_follows_forecast(monkeypatch, tmp_path):
+    monkeypatch.setattr(forecast, "MODEL_CACHE_DIR", str(tmp_path))
+    assert os.path.dirname(backtest._cache_path("k")) == str(tmp_path)
+
+
+def test_seasonal_naive_with_gaps():
+    # чисто сезонный ряд без нескольких месяцев: сезонный наивный прогноз точен,
+    # если горизонты отсчитываются по календарю, а не по строкам истории
+    ds = pd.date_range("2019-01-01", periods=48, freq="MS")
+    hist = pd.DataFrame({"ds": ds, "y": 100.0 + 10 * ds.month})
+    hist = hist.drop(index=[30, 31, 40]).reset_index(drop=True)
+    metrics, predictions = backtest.backtest(hist, horizon=3, min_train=24, models=("seasonal_naive",))
+    assert len(predictions) > 0
+    assert np.allclose(metrics["mae"], 0)
+    # пропущенные месяцы в метрики не входят
+    assert not predictions["ds"].isin(ds[[30, 31, 40]]).any()
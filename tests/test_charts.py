@@ -0,0 +1,55 @@
+﻿"""Прореживание и свёртка легенды графиков (analytics.charts)."""
+import numpy as np
+import pandas as pd
+import pytest
+from analytics.charts import OTHER_LABEL, fold_categories, line, lttb_indices, minmax_indices
+
+
+@pytest.fixture(scope="module")
+def series():
+    rng = np.random.default_rng(3)
+    y = np.cumsum(rng.normal(size=10_000))
+    y[1234], y[7777] = 1e4, -1e4  # пики
+    return y
+
+
+@pytest.mark.parametrize("n_out", [4, 10, 101, 1000])
+def test_minmax(series, n_out):
+    idx = minmax_indices(series, n_out)
+    assert len(idx) <= n_out
+    assert np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(series) - 1
+    assert {1234, 7777} <= set(idx)
+
+
+@pytest.mark.parametrize("n_out", [3, 10, 101, 1000])
+def test_lttb(series, n_out):
+    x = pd.date_range("2020-01-01", periods=len(series), freq="h")
+    idx = lttb_indices(x, series, n_out)
+    assert len(idx) == n_out
+    assert np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(series) - 1
+    if n_out > 3:  # при трёх точках на пики остаётся одна
+        assert {1234, 7777} <= set(idx)
+
+
+def test_passthrough_below_limit():
+    y = np.arange(50.0)
+    assert np.array_equal(minmax_indices(y, 50), np.arange(50))
+    assert np.array_equal(lttb_indices(np.arange(50), y, 80), np.arange(50))
+
+
+def test_fold_categories():
+    s = pd.Series(pd.Categorical(["a"] * 5 + ["b"] * 4 + ["c"] * 3 + ["d"]))
+    folded = fold_categories(s, top=2)
+    assert folded.value_counts().to_dict() == {"a": 5, "b": 4, OTHER_LABEL: 4}
+    # значений не больше top — без «Других»
+    assert fold_categories(s, top=4).tolist() == s.astype(str).tolist()
+
+
+def test_line_bounds_points_per_series():
+    x = pd.date_range("2020-01-01", periods=5_000, freq="D")
+    df = pd.DataFrame({"x": np.tile(x, 3), "y": np.arange(15_000.0), "c": np.repeat(list("abc"), 5_000)})
+    fig = line(df, "x", "y", color="c", max_points=300)
+    assert len(fig.data) == 3
+    assert sum(len(t.x) for t in fig.data) <= 300
@@ -0,0 +1,61 @@
+﻿"""kmeans_1d сверяется с полным перебором разбиений на малых входах."""
+import itertools
+import numpy as np
+import pytest
+from analytics.clustering import kmeans_1d
+
+
+def _sse(x, labels) -> float:
+    return sum(((x[labels == c] - x[labels == c].mean()) ** 2).sum() for c in np.unique(labels))
+
+
+def _brute_sse(x, k: int) -> float:
+    """Минимальная SSE по всем назначениям точек k непустым кластерам."""
+    best = np.inf
+    for labels in itertools.product(range(k), repeat=len(x)):
+        labels = np.array(labels)
+        if len(np.unique(labels)) == k:
+            best = min(best, _sse(x, labels))
+    return best
+
+
+def _check(x, labels, centers, k: int):
+    """Метки в исходном порядке, все k кластеров непусты, центры — средние по возрастанию."""
+    assert len(labels) == len(x) and len(centers) == k
+    assert sorted(np.unique(labels)) == list(range(k))
+    np.testing.assert_allclose(centers, [x[labels == c].mean() for c in range(k)])
+    assert np.all(np.diff(centers) >= 0)
+
+
+@pytest.mark.parametrize("seed", range(12))
+@pytest.mark.parametrize("k", [1, 2, 3])
+def test_matches_brute_force(seed, k):
+    rng = np.random.default_rng(seed)
+    x = rng.integers(0, 20, rng.integers(k, 8)).astype(np.float64)
+    labels, centers = kmeans_1d(x, k)
+    _check(x, labels, centers, k)
+    assert _sse(x, labels) == pytest.approx(_brute_sse(x, k), abs=1e-9)
+
+
+def test_more_clusters_than_distinct_values():
+    x = np.array([3.0, 1.0, 2.0, 1.0, 2.0])
+    labels, centers = kmeans_1d(x, 4)
+    _check(x, labels, centers, 4)
+    assert _sse(x, labels) == 0
+    # k больше числа точек — по кластеру на точку
+    labels, centers = kmeans_1d(x, 10)
+    _check(x, labels, centers, len(x))
+    np.testing.assert_array_equal(centers, np.sort(x))
+
+
+def test_constant_input():
+    x = np.full(6, 7.0)
+    for k in (1, 3):
+        labels, centers = kmeans_1d(x, k)
+        _check(x, labels, centers, k)
+        np.testing.assert_array_equal(centers, np.full(k, 7.0))
+
+
+def test_empty_input():
+    labels, centers = kmeans_1d([], 3)
+    assert len(labels) == 0 and len(centers) == 0
@@ -0,0 +1,113 @@
+﻿"""Ответы DailyCube сверяются с группировками pandas по исходным строкам."""
+import numpy as np
+import pandas as pd
+import pytest
+from analytics.cube import DIMENSIONS, build_cube, extend_cube
+
+START, END = "2021-02-10", "2022-03-17"  # неполные месяцы на обоих краях
+
+
+def _frame(n: int, seed: int) -> pd.DataFrame:
+    """Строки в формате load_data: категории с пропусками, NaT в конце, сортировка по дате."""
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2020-11-03") + pd.to_timedelta(rng.integers(0, 800, n), unit="D")
+    dates = dates.where(rng.random(n) > 0.01)
+    values = {
+        "airline": [f"A{i}" for i in range(7)],
+        "airport": [f"P{i}" for i in range(11)],
+        "flight_no": [f"F{i}" for i in range(150)],
+        "contract_short": [f"C{i}" for i in range(5)],
+    }
+    df = pd.DataFrame({
+        dim: pd.Categorical(rng.choice(vals, n)).set_categories(sorted(vals))
+        for dim, vals in values.items()
+    })
+    for dim in DIMENSIONS:
+        df.loc[rng.random(n) < 0.02, dim] = np.nan
+    df["dep_date"] = dates
+    df["passengers"] = rng.integers(0, 300, n).astype(np.int16)
+    return df.sort_values("dep_date", kind="stable", ignore_index=True)
+
+
+@pytest.fixture(scope="module")
+def rows():
+    return _frame(20_000, 7)
+
+
+@pytest.fixture(scope="module")
+def cube(rows):
+    return build_cube(rows)
+
+
+def _period(rows):
+    return rows[(rows.dep_date >= START) & (rows.dep_date <= END)]
+
+
+def test_total(rows, cube):
+    part = _period(rows)
+    assert cube.total(START, END) == {"passengers": int(part.passengers.sum()), "flights": len(part)}
+
+
+@pytest.mark.parametrize("dim", DIMENSIONS)
+def test_top(rows, cube, dim):
+    expected = _period(rows).groupby(dim, observed=True).passengers.sum().sort_values(ascending=False, kind="stable")
+    top = cube.top(dim, START, END, 5)
+    assert top["value"].tolist() == expected.head(5).tolist()
+    assert set(top[dim]) <= set(expected.index)
+
+
+def test_mean_load(rows, cube):
+    expected = _period(rows).groupby("flight_no", observed=True).passengers.mean()
+    got = cube.mean_load(START, END).set_index("flight_no").passengers
+    expected.index = expected.index.astype(str)
+    assert np.allclose(got.reindex(expected.index).to_numpy(), expected.to_numpy())
+    assert len(got) == len(expected)
+
+
+def test_daily(rows, cube):
+    part = _period(rows)
+    expected = part.groupby("dep_date").passengers.agg(["sum", "size"])
+    got = cube.daily(START, END).set_index("dep_date")
+    got = got[got.flights > 0]
+    assert got.passengers.tolist() == expected["sum"].tolist()
+    assert got.flights.tolist() == expected["size"].tolist()
+
+
+@pytest.mark.parametrize("start, end", [(START, END), ("2021-03-01", "2021-05-31"), ("2021-04-05", "2021-04-20")])
+def test_monthly(rows, cube, start, end):
+    part = rows[(rows.dep_date >= start) & (rows.dep_date <= end)]
+    month = part.dep_date.dt.to_period("M").astype(str)
+    expected = part.groupby(month).agg(passengers=("passengers", "sum"), flights=("flight_no", "nunique"))
+    got = cube.monthly(start, end).set_index("month")
+    assert got.index.tolist() == expected.index.tolist()
+    assert got.passengers.tolist() == expected.passengers.tolist()
+    assert got.flights.tolist() == expected.flights.tolist()
+
+
+@pytest.mark.parametrize("dim", DIMENSIONS)
+def test_monthly_matrix(rows, cube, dim):
+    categories, months, pax, flights = cube.monthly_matrix(dim)
+    dated = rows[rows.dep_date.notna()]
+    expected = (dated.groupby([dim, dated.dep_date.dt.to_period("M")], observed=True).passengers.sum()
+                .unstack(fill_value=0).reindex(index=categories, columns=months, fill_value=0))
+    assert np.array_equal(pax, expected.to_numpy())
+
+
+def test_month_dow_counts(rows, cube):
+    part = _period(rows)
+    expected = np.zeros((12, 7), dtype=np.int64)
+    np.add.at(expected, (part.dep_date.dt.month - 1, part.dep_date.dt.dayofweek), 1)
+    assert np.array_equal(cube.month_dow_counts(START, END), expected)
+
+
+def test_extend_cube(rows):
+    extra = _frame(3_000, 8)
+    merged = pd.concat([rows, extra], ignore_index=True)
+    merged = merged.sort_values("dep_date", kind="stable", ignore_index=True)
+    a, b = extend_cube(build_cube(rows), extra), build_cube(merged)
+    for field in ("daily_pax", "daily_flights", "month_flights"):
+        assert np.array_equal(getattr(a, field), getattr(b, field)), field
+    for dim in DIMENSIONS:
+        assert a.prefix[dim].categories.equals(b.prefix[dim].categories)
+        for field in ("passengers", "flights", "day_offsets", "cum_pax"):
+            assert np.array_equal(getattr(a.prefix[dim], field), getattr(b.prefix[dim], field)), (dim, field)
@@ -0,0 +1,31 @@
+﻿"""Разбор выгрузки: файлы архива с разными форматами дат."""
+import io, zipfile
+import pandas as pd
+import utils
+
+HEADER = ";".join(utils.SOURCE_COLUMNS)
+
+
+def _zip(*members) -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for i, lines in enumerate(members):
+            z.writestr(f"m{i}.csv", "\n".join([HEADER, *lines]).encode("cp1251"))
+    return buf.getvalue()
+
+
+def test_mixed_date_formats_across_members():
+    raw = _zip(
+        ["S7;DME;S7 101;05.01.2024;120;Д-1"],
+        ["S7;DME;S7 101;06.01.2024 10:30;110;Д-1", "U6;SVX;U6 202;07.01.2024 23:05:10;90;Д-2"],
+        ["U6;SVX;U6 202;не дата;80;Д-2"],
+    )
+    df = utils.parse_archive(raw, True)
+    assert sorted(df.dep_date.dropna()) == [
+        pd.Timestamp("2024-01-05"), pd.Timestamp("2024-01-06 10:30"), pd.Timestamp("2024-01-07 23:05:10")]
+    assert df.dep_date.isna().sum() == 1
+
+
+def test_day_first():
+    df = utils.parse_archive(_zip(["S7;DME;S7 101;02.03.2024;120;Д-1"]), True)
+    assert df.dep_date.iloc[0] == pd.Timestamp("2024-03-02")
@@ -0,0 +1,88 @@
+﻿"""Накопительное хранилище: дедупликация, повторная загрузка, удаление прошлых версий."""
+import io, os, zipfile
+import numpy as np
+import pandas as pd
+import pytest
+from analytics import artifacts, cube, store
+from utils import SOURCE_COLUMNS
+
+HEADER = ";".join(SOURCE_COLUMNS)
+
+
+def _zip(*members) -> bytes:
+    """ZIP выгрузки: каждый member — строки CSV (а/к; а/п; рейс; дата; пасс.; договор)."""
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for i, lines in enumerate(members):
+            z.writestr(f"m{i}.csv", "\n".join([HEADER, *lines]).encode("cp1251"))
+    return buf.getvalue()
+
+
+def _frame(rows) -> pd.DataFrame:
+    """Строки в формате load_data: (рейс, дата или None, аэропорт)."""
+    flight, date, airport = zip(*rows)
+    return pd.DataFrame({
+        "flight_no": pd.Categorical(flight),
+        "dep_date": pd.to_datetime(list(date)),
+        "airport": pd.Categorical(airport),
+        "passengers": np.arange(len(rows), dtype=np.int16),
+    }).sort_values("dep_date", kind="stable", ignore_index=True)
+
+
+@pytest.fixture(autouse=True)
+def store_dir(monkeypatch, tmp_path):
+    monkeypatch.setattr(store, "STORE_DIR", str(tmp_path / "store"))
+    monkeypatch.setattr(artifacts, "REPORT_DIR", str(tmp_path / "reports"))
+    # кэши Streamlit — по ключу версии, а он не зависит от каталога
+    store._cached_store.clear()
+    cube._cached_cube.clear()
+    return tmp_path / "store"
+
+
+def test_dedupe_keeps_repeats_within_file():
+    new = _frame([("F1", "2024-01-05", "AAA"), ("F1", "2024-01-05", "AAA"), ("F2", "2024-01-05", "AAA")])
+    added, duplicates = store.dedupe(new, pd.DataFrame())
+    assert len(added) == 3 and duplicates == 0
+
+
+def test_dedupe_drops_stored_keys():
+    existing = _frame([("F1", "2024-01-05", "AAA"), ("F2", "2024-01-06", "AAA"), ("F3", None, "BBB")])
+    new = _frame([
+        ("F1", "2024-01-05", "AAA"),  # уже в хранилище
+        ("F1", "2024-01-05", "CCC"),  # другой аэропорт
+        ("F2", "2024-01-07", "AAA"),  # другой день
+        ("F3", None, "BBB"),          # без даты, уже в хранилище
+        ("F4", None, "BBB"),          # без даты, новый
+    ])
+    added, duplicates = store.dedupe(new, existing)
+    assert duplicates == 2
+    kept = set(zip(added.flight_no.astype(str), added.airport.astype(str)))
+    assert kept == {("F1", "CCC"), ("F2", "AAA"), ("F4", "BBB")}
+
+
+def test_reappend_changes_nothing(store_dir):
+    raw = _zip(["S7;DME;S7 101;05.01.2024;120;Д-1", "S7;DME;S7 101;05.01.2024;110;Д-1"])
+    first = store.append(raw, True)
+    assert first["added"] == 2 and not first["skipped"]
+    files = sorted(os.listdir(store_dir))
+    again = store.append(raw, True)
+    assert again["skipped"] and again["added"] == 0
+    assert again["dataset_key"] == first["dataset_key"]
+    assert sorted(os.listdir(store_dir)) == files
+    assert store.read_store_manifest()["rows"] == 2
+
+
+def test_old_versions_removed(store_dir, tmp_path):
+    a = _zip(["S7;DME;S7 101;05.01.2024;120;Д-1"])
+    b = _zip(["S7;DME;S7 101;05.01.2024;120;Д-1", "U6;SVX;U6 202;06.01.2024;90;Д-2"])
+    store.append(a, True)
+    stats = store.append(b, True)
+    assert stats["added"] == 1 and stats["duplicates"] == 1
+    key = stats["dataset_key"]
+    assert sorted(f for f in os.listdir(store_dir) if f.endswith(".arrow")) == [f"cube-{key}.arrow", f"rows-{key}.arrow"]
+    # куб версии лежит в хранилище, а не в каталоге отчётов
+    assert not os.path.exists(tmp_path / "reports")
+
+    df = store.load_store()
+    assert len(df) == 2 and df.attrs["dataset_key"] == key
+    assert cube.get_cube(df).total("2024-01-01", "2024-01-31") == {"passengers": 210, "flights": 2}
@@ -1,62 +1,752 @@
-﻿import pandas as pd
-import glob, zipfile, urllib.request
+﻿import numpy as np
+import pandas as pd
+import glob, io, zipfile, urllib.request
+import hashlib, os, sys, uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 import streamlit as st
+from analytics.diagnostics import cache_miss, record, stage
 
+# Copy-on-Write: набор данных один на все сессии (st.cache_resource) и лежит
+# в memory map только для чтения — срезы и производные фреймы страниц копируют
+# данные лениво, только при записи, и никогда не меняют общий набор
+pd.set_option("mode.copy_on_write", True)
 
-@st.cache_data
-def load_data(uploaded_file=None):
+# Каталог кэша нормализованных данных: один файл Arrow IPC на каждый архив,
+# имя файла — хэш содержимого исходного ZIP/CSV
+CACHE_DIR = "data_cache"
+# Предельный объём кэша; самые давно использованные записи удаляются первыми
+CACHE_MAX_BYTES = int(os.environ.get("AERONAV_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+# Версия формата: увеличивать при любом изменении нормализации в load_data,
+# чтобы старые записи кэша не подхватывались
+CACHE_VERSION = 3
+
+# Потоковый режим (load_aggregates): объём CSV на один блок чтения и сколько
+# строк частичных агрегатов копить до повторной свёртки
+STREAM_BLOCK_BYTES = int(os.environ.get("AERONAV_STREAM_BLOCK_BYTES", 64 * 1024 ** 2))
+STREAM_COMPACT_ROWS = 2_000_000
+# Архив на сервере для потокового режима, если файл не загружен
+ARCHIVE_PATH = os.environ.get("AERONAV_ARCHIVE_PATH", "")
+
+# Форматы «Дата вылета» в выгрузках: одни файлы пишут дату, другие — дату со временем
+DATE_FORMATS = ("%d.%m.%Y", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S")
+
+# Колонки выгрузки, которые нужны дашборду
+SOURCE_COLUMNS = ("Код а/к", "Код а/п", "Номер рейса", "Дата вылета", "Кол-во пасс.", "№ договора")
+
+
+def _content_key(fileobj, *variant) -> str:
+    """Ключ кэша: sha256 содержимого файла (читается блоками) + версия формата и вариант схемы."""
+    h = hashlib.sha256()
+    h.update(f"v{CACHE_VERSION}:{':'.join(variant)}:".encode())
+    pos = fileobj.tell()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(1 << 20), b""):
+        h.update(chunk)
+    fileobj.seek(pos)
+    return h.hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CACHE_DIR, f"{key}.arrow")
+
+
+def read_arrow(path: str):
+    """
+    Читает DataFrame из файла Arrow IPC через memory map.
+    Возвращает None, если файла нет или он повреждён (битый файл удаляется).
+
+    split_blocks=True — без склейки колонок в общие блоки pandas: числовые
+    колонки, даты и коды категорий без пропусков остаются представлениями
+    страниц файла (только для чтения), без копии в памяти процесса; страницы
+    делит между сессиями и процессами кэш ОС.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with pa.memory_map(path, "r") as src:
+            table = pa.ipc.open_file(src).read_all()
+        df = table.to_pandas(split_blocks=True)
+    except (pa.ArrowInvalid, OSError):
+        # битая запись (например, оборванная запись) — удаляем и парсим заново
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+    # отмечаем использование — по mtime работает вытеснение
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    return df
+
+
+def write_atomic(path: str, write):
+    """
+    Атомарная запись файла: write(tmp) пишет во временный файл рядом с path,
+    затем os.replace подменяет path целиком — параллельные сессии и процессы
+    не увидят недописанный файл. Каталог создаётся при необходимости.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_arrow(path: str, df: pd.DataFrame):
+    """Атомарно записывает DataFrame в файл Arrow IPC."""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    def write(tmp):
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+
+    write_atomic(path, write)
+
+
+def _read_cache(key: str):
+    """Нормализованный DataFrame из кэша или None, если записи нет или она повреждена."""
+    return read_arrow(_cache_path(key))
+
+
+def _write_cache(key: str, df: pd.DataFrame):
+    """Атомарно записывает DataFrame в кэш и подрезает кэш до CACHE_MAX_BYTES."""
+    path = _cache_path(key)
+    write_arrow(path, df)
+    evict_lru(CACHE_DIR, CACHE_MAX_BYTES, keep={path}, pattern="*.arrow")
+
+
+def evict_lru(directory: str, max_bytes: int, keep=(), pattern: str = "*"):
+    """
+    Удаляет самые старые (по mtime) файлы каталога, пока их суммарный размер
+    больше max_bytes. Файлы из keep не трогаются. Чтение записи кэша должно
+    обновлять её mtime (os.utime) — тогда это вытеснение LRU.
+    """
+    entries = []
+    for p in glob.glob(os.path.join(directory, pattern)):
+        try:
+            s = os.stat(p)
+        except OSError:
+            continue
+        entries.append((s.st_mtime, s.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        if p in keep:
+            continue
+        try:
+            os.remove(p)
+            total -= size
+        except OSError:
+            pass
+
+
+def _csv_options(**read_options) -> dict:
+    """
+    Параметры CSV-ридера Arrow для выгрузки (cp1251, «;»): только нужные
+    колонки, все как строки — приведение типов делает _normalize, как раньше
+    делал pandas (errors="coerce").
+    """
+    return {
+        "read_options": pacsv.ReadOptions(encoding="cp1251", use_threads=True, **read_options),
+        "parse_options": pacsv.ParseOptions(delimiter=";"),
+        "convert_options": pacsv.ConvertOptions(
+            include_columns=list(SOURCE_COLUMNS),
+            column_types={c: pa.string() for c in SOURCE_COLUMNS},
+            # пустые ячейки — пропуски, как у pd.read_csv
+            strings_can_be_null=True,
+        ),
+    }
+
+
+def _read_csv_table(fileobj) -> pa.Table:
+    """Читает один CSV выгрузки целиком многопоточным CSV-ридером Arrow."""
+    return pacsv.read_csv(fileobj, **_csv_options())
+
+
+def _read_zip_member(raw: bytes, name: str) -> pa.Table:
+    # у каждого потока свой ZipFile поверх общего буфера: член архива читается
+    # потоком, без распаковки на диск
+    with zipfile.ZipFile(io.BytesIO(raw)) as Z, Z.open(name) as fh:
+        return _read_csv_table(fh)
+
+
+def _csv_members(Z: zipfile.ZipFile) -> list:
+    return [
+        i.filename for i in Z.infolist()
+        if not i.is_dir()
+        and i.filename.lower().endswith(".csv")
+        and not i.filename.startswith("__MACOSX/")
+    ]
+
+
+def _read_archive(raw: bytes, is_zip: bool) -> pa.Table:
+    """Параллельно читает все CSV из ZIP (или одиночный CSV) в одну таблицу Arrow."""
+    if not is_zip:
+        return _read_csv_table(io.BytesIO(raw))
+
+    with zipfile.ZipFile(io.BytesIO(raw)) as Z:
+        names = _csv_members(Z)
+    if not names:
+        return None
+
+    # CSV-ридер Arrow отпускает GIL, поэтому хватает пула потоков
+    with ThreadPoolExecutor(max_workers=min(len(names), os.cpu_count() or 1)) as pool:
+        tables = list(pool.map(partial(_read_zip_member, raw), names))
+    return pa.concat_tables(tables)
+
+
+def _encode(col: pa.ChunkedArray, fn=None):
+    """
+    Словарно кодирует колонку Arrow и применяет fn только к различным значениям.
+    Дат, договоров и значений пассажиров в выгрузке — тысячи на миллионы строк,
+    так что разбор идёт в сотни раз меньше.
+
+    Возвращает (codes, uniques): значение строки i — uniques[codes[i]].
+    """
+    enc = pc.dictionary_encode(col.combine_chunks())
+    # последний элемент словаря — пропуск (null)
+    uniques = pd.Series(enc.dictionary.to_pylist() + [None], dtype=object)
+    codes = enc.indices.fill_null(len(enc.dictionary)).to_numpy()
+    if fn is not None:
+        uniques = fn(uniques)
+    return codes, uniques
+
+
+def _map_distinct(col: pa.ChunkedArray, fn) -> np.ndarray:
+    """Применяет fn к различным значениям колонки и раскладывает результат по строкам."""
+    codes, uniques = _encode(col, fn)
+    return np.asarray(uniques)[codes]
+
+
+def _categorical(col: pa.ChunkedArray, fn=None) -> pd.Categorical:
+    """Строковая колонка → pandas Categorical прямо из словаря Arrow, без строк на каждую строку."""
+    codes, uniques = _encode(col, fn)
+    # fn может склеить разные исходные значения в одно — перекодируем словарь;
+    # категории упорядочены, как сортировала бы строки группировка по object
+    ucodes, categories = pd.factorize(np.asarray(uniques, dtype=object), sort=True)
+    return pd.Categorical.from_codes(ucodes[codes], categories)
+
+
+def _compact_int(values: np.ndarray) -> np.ndarray:
+    """Минимальный из int16/int32, в который помещаются значения."""
+    if len(values) == 0 or (values.min() >= np.iinfo(np.int16).min and values.max() <= np.iinfo(np.int16).max):
+        return values.astype(np.int16)
+    return values.astype(np.int32)
+
+
+def _parse_dates(s: pd.Series) -> pd.Series:
+    """
+    Разбор дат вылета (день первым). Значения всех файлов архива разбираются
+    вместе, а без format pandas угадывает формат по первому значению и
+    остальные форматы превращает в NaT. Поэтому форматы DATE_FORMATS
+    пробуются по очереди для ещё не разобранных значений, а оставшиеся —
+    format="mixed" (поэлементно, медленно, но таких значений обычно нет).
+    """
+    out = pd.Series(pd.NaT, index=s.index, dtype="datetime64[ns]")
+    rest = s.notna().to_numpy(copy=True)
+    for fmt in DATE_FORMATS:
+        if not rest.any():
+            return out
+        out[rest] = pd.to_datetime(s[rest], format=fmt, errors="coerce")
+        rest &= out.isna().to_numpy()
+    if rest.any():
+        out[rest] = pd.to_datetime(s[rest], format="mixed", dayfirst=True, errors="coerce")
+    return out
+
+
+def _short_contract(s: pd.Series) -> pd.Series:
+    # сокращаем договоры до первого слова
+    return s.fillna("Без договора") \
+        .str.extract(r"([^\\s]+)")[0] \
+        .fillna("Без договора")
+
+
+def _to_passengers(s: pd.Series) -> pd.Series:
+    # приводим пассажиров к числу
+    return pd.to_numeric(s, errors="coerce").fillna(0).astype(int)
+
+
+def _normalize(table: pa.Table, compact: bool = True) -> pd.DataFrame:
+    """
+    Приводит сырые колонки выгрузки к рабочей схеме.
+
+    compact=True — компактная схема: airline, airport, flight_no и contract_short
+    как категории (коды + словарь), passengers как int16/int32.
+    compact=False — прежняя схема с object-строками и int64.
+    """
+    # datetime
+    dep_date = _map_distinct(table["Дата вылета"], _parse_dates)
+    passengers = _map_distinct(table["Кол-во пасс."], _to_passengers)
+
+    if compact:
+        return pd.DataFrame({
+            "flight_no": _categorical(table["Номер рейса"]),
+            "dep_date": dep_date,
+            "airline": _categorical(table["Код а/к"]),
+            "airport": _categorical(table["Код а/п"]),
+            "passengers": _compact_int(passengers),
+            "contract_short": _categorical(table["№ договора"], _short_contract),
+        })
+
+    return pd.DataFrame({
+        "flight_no": table["Номер рейса"].to_pandas(),
+        "dep_date": dep_date,
+        "airline": table["Код а/к"].to_pandas(),
+        "airport": table["Код а/п"].to_pandas(),
+        "passengers": passengers,
+        "contract_short": _map_distinct(table["№ договора"], _short_contract),
+    })
+
+
+def memory_footprint(df: pd.DataFrame) -> dict:
+    """
+    Объём DataFrame в памяти, байт:
+    - "after"  — фактический (memory_usage(deep=True));
+    - "before" — тот же набор данных в прежней схеме (object-строки, int64).
+    Для категорий «before» считается по частотам кодов, без материализации строк.
+    """
+    after = int(df.memory_usage(deep=True, index=False).sum())
+    before = 0
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            # object-колонка: указатель на строку + сам объект строки в каждой строке
+            # пропуски (код -1) кладём в последнюю ячейку нулевого размера
+            sizes = np.array([sys.getsizeof(c) for c in s.cat.categories] + [0], dtype=np.int64)
+            codes = s.cat.codes.to_numpy()
+            counts = np.bincount(np.where(codes < 0, len(sizes) - 1, codes), minlength=len(sizes))
+            before += 8 * len(s) + int((counts * sizes).sum())
+        elif pd.api.types.is_integer_dtype(s.dtype):
+            before += 8 * len(s)
+        else:
+            before += int(s.memory_usage(deep=True, index=False))
+    return {"before": before, "after": after}
+
+
+def date_index(df: pd.DataFrame) -> np.ndarray:
+    """
+    Индекс дат: колонка dep_date как datetime64-массив без копии.
+    load_data возвращает строки, отсортированные по dep_date (NaT в конце),
+    так что по нему работает двоичный поиск.
+    """
+    return df["dep_date"].to_numpy()
+
+
+def date_bounds(df: pd.DataFrame):
+    """Первая и последняя дата вылета за O(1) (без NaT); (NaT, NaT) для пустых данных."""
+    if is_aggregated(df):
+        df = df.daily[DAILY_DIMENSIONS[0]]
+    idx = date_index(df)
+    n_valid = idx.searchsorted(np.datetime64("NaT"))
+    if n_valid == 0:
+        return pd.NaT, pd.NaT
+    return pd.Timestamp(idx[0]), pd.Timestamp(idx[n_valid - 1])
+
+
+def date_slice(df: pd.DataFrame, start=None, end=None) -> pd.DataFrame:
+    """
+    Строки с start <= dep_date <= end (границы None — без ограничения) двоичным
+    поиском по индексу дат. Результат — срез iloc, т. е. представление без
+    копирования данных; не модифицируйте его.
+    """
+    idx = date_index(df)
+    i = 0 if start is None else idx.searchsorted(np.datetime64(pd.Timestamp(start), "ns"), "left")
+    # NaT отсортированы в конец: верхняя граница по умолчанию — первая NaT
+    j = idx.searchsorted(np.datetime64("NaT") if end is None else np.datetime64(pd.Timestamp(end), "ns"),
+                         "left" if end is None else "right")
+    return df.iloc[i:max(i, j)]
+
+
+def shared_view(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Представление общего набора (load_data и т. п.) для одной страницы: новый
+    DataFrame над теми же колонками без копирования данных (Copy-on-Write).
+    Добавленные или изменённые в нём колонки видит только эта страница.
+    Aggregates неизменяемый — отдаётся как есть.
+    """
+    if is_aggregated(df):
+        return df
+    return df.copy(deep=False)
+
+
+class LocalFile(io.BytesIO):
+    """
+    Файл с диска в интерфейсе загруженного в Streamlit файла (getvalue, name):
+    load_data(LocalFile(path)) — загрузка вне браузера (отчёт, API).
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            super().__init__(f.read())
+        self.name = path
+
+
+def parse_archive(raw: bytes, is_zip: bool, compact: bool = True) -> pd.DataFrame:
+    """
+    Разбирает ZIP/CSV выгрузки в нормализованный DataFrame (см. _normalize)
+    в порядке строк файла, без сортировки и кэша. Пустой DataFrame — нет данных.
+    """
+    with stage("parse_csv"):
+        table = _read_archive(raw, is_zip)
+        record(rows=0 if table is None else table.num_rows)
+    if table is None or table.num_rows == 0:
+        return pd.DataFrame()
+    with stage("normalize", rows=table.num_rows):
+        return _normalize(table, compact)
+
+
+def concat_frames(frames: list) -> pd.DataFrame:
+    """
+    Склеивает наборы с одинаковыми колонками. Категориальные колонки с разными
+    словарями объединяются в одну категорию с общим (отсортированным) словарём,
+    а не превращаются в object, как у pd.concat.
+    """
+    frames = [f for f in frames if len(f.columns)]
+    out = pd.concat(frames, ignore_index=True)
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype) and not isinstance(out[col].dtype, pd.CategoricalDtype):
+            out[col] = pd.api.types.union_categoricals([f[col] for f in frames], sort_categories=True)
+    return out
+
+
+@st.cache_resource(show_spinner="Загружаем данные…")
+def load_data(uploaded_file=None, compact: bool = True):
     """
     Загружает данные из:
     - загруженного ZIP/CSV-файла
     - если файл не загружен — стягивает образец из Google Drive
 
+    Нормализованный результат кэшируется на диске (Arrow IPC, каталог CACHE_DIR)
+    по хэшу содержимого архива: повторная загрузка того же архива читает кэш
+    через memory map и не парсит CSV.
+
+    Результат — один неизменяемый набор на все сессии (st.cache_resource, без
+    копии на каждый вызов, как у st.cache_data), колонки — представления
+    memory map только для чтения (см. read_arrow). Не изменяйте его: страницы
+    получают shared_view, производные колонки держат в своих структурах.
+
+    Строки отсортированы по dep_date (NaT в конце) — выборка по датам делается
+    двоичным поиском через date_slice, без булевых масок.
+
+    compact=True (по умолчанию) — компактная схема: строковые колонки как
+    категории, passengers как int16/int32 (см. _normalize). Объём в памяти
+    до/после лежит в df.attrs["memory"] (см. memory_footprint), ключ кэша —
+    в df.attrs["dataset_key"]: по нему производные структуры (куб и т. п.)
+    строятся один раз на архив.
+
     Возвращает объединённый DataFrame с колонками:
     flight_no, dep_date (datetime), airline, airport, passengers, contract_short
     """
-    # 1) Если пользователь загрузил ZIP или CSV — распакуем/прочитаем:
+    # 1) Если пользователь загрузил ZIP или CSV — читаем его прямо из памяти
     if uploaded_file:
-        # ZIP?
-        if uploaded_file.name.endswith(".zip"):
-            with zipfile.ZipFile(uploaded_file, "r") as Z:
-                Z.extractall("data_custom")
-            paths = glob.glob("data_custom/**/*.csv", recursive=True)
-        else:
-            # Одиночный CSV
-            paths = [uploaded_file]
+        raw = uploaded_file.getvalue()
+        is_zip = uploaded_file.name.endswith(".zip")
     else:
-        # иначе стягиваем демонстрационный архив
+        # иначе стягиваем демонстрационный архив (тоже в память)
         url = "https://drive.google.com/uc?id=1kXz-DCE2jgKuAfyvlAtri0fOYvRdz1J_&export=download"
-        zip_path = "sample_data.zip"
-        urllib.request.urlretrieve(url, zip_path)
-        with zipfile.ZipFile(zip_path, "r") as Z:
-            Z.extractall("data")
-        paths = glob.glob("data/**/*.csv", recursive=True)
-
-    dfs = []
-    for p in paths:
-        df0 = pd.read_csv(p, sep=";", encoding="cp1251")
-        # бросаем «Unnamed»
-        df0 = df0.loc[:, ~df0.columns.str.contains("^Unnamed")]
-        # приводим пассажиров к числу
-        df0["passengers"] = pd.to_numeric(df0["Кол-во пасс."], errors="coerce").fillna(0).astype(int)
-        # сокращаем договоры до первого слова
-        df0["contract_short"] = df0["№ договора"].fillna("Без договора") \
-            .str.extract(r"([^\\s]+)")[0] \
-            .fillna("Без договора")
-        # переименовываем для удобства
-        df0 = df0.rename(columns={
-            "Код а/к": "airline",
-            "Код а/п": "airport",
-            "Номер рейса": "flight_no",
-            "Дата вылета": "dep_date"
-        })
-        # datetime
-        df0["dep_date"] = pd.to_datetime(df0["dep_date"], dayfirst=True, errors="coerce")
-        dfs.append(df0[["flight_no", "dep_date", "airline", "airport", "passengers", "contract_short"]])
+        with urllib.request.urlopen(url) as resp:
+            raw = resp.read()
+        is_zip = True
+
+    with stage("content_key"):
+        key = _content_key(io.BytesIO(raw), "compact" if compact else "plain")
+    with stage("read_cache"):
+        cached = _read_cache(key)
+    if cached is not None:
+        # тело выполнилось — промах st.cache_resource, но попадание в дисковый кэш
+        cache_miss("disk")
+        record(rows=len(cached))
+        cached.attrs["dataset_key"] = key
+        cached.attrs["memory"] = memory_footprint(cached)
+        return cached
+
+    cache_miss()
+    full = parse_archive(raw, is_zip, compact)
+    if full.empty:
+        return full  # пусто — сигнал
+
+    with stage("sort", rows=len(full)):
+        full = full.sort_values("dep_date", kind="stable", ignore_index=True)
+    with stage("write_cache", rows=len(full)):
+        _write_cache(key, full)
+        # дальше работаем с memory map записи, а не с разобранной копией в памяти
+        shared = _read_cache(key)
+    if shared is not None:
+        full = shared
+    record(rows=len(full))
+    full.attrs["dataset_key"] = key
+    full.attrs["memory"] = memory_footprint(full)
+    return full
+
+
+# ——— Потоковый режим: агрегаты вместо строк ————————————————————————————————
+
+# Измерения с дневными агрегатами (день × значение); flight_no — в агрегате рейс × месяц
+DAILY_DIMENSIONS = ("airline", "airport", "contract_short")
+# Свёртка агрегатов: счётчики и суммы складываются, первый/последний вылет — min/max
+SUM_ROWS = {"passengers": "sum", "rows": "sum"}
+FLIGHT_MONTH_SUMS = {"rows": "sum", "passengers": "sum", "passengers_sq": "sum", "first": "min", "last": "max"}
+
+
+@dataclass
+class Aggregates:
+    """
+    Набор потокового режима (load_aggregates): вместо строк — отдельные
+    агрегаты, размер которых ограничен числом дней, месяцев и значений
+    измерений, а не числом строк архива:
+    - daily — {измерение: dep_date, <измерение>, passengers, rows} для
+      DAILY_DIMENSIONS;
+    - flight_months — рейс × календарный месяц, см. flight_month_sums;
+    - monthly — month (первый день месяца), passengers, rows.
+    rows — число исходных строк (int32), passengers — сумма (int64). Строки без
+    даты вылета не входят ни в один агрегат; таблицы отсортированы по дате.
+
+    Набор неизменяемый и общий для всех сессий, shared_view отдаёт его как есть.
+    """
+    daily: dict
+    flight_months: pd.DataFrame
+    monthly: pd.DataFrame
+    attrs: dict = field(default_factory=dict)
+
+    TABLES = (*(f"daily-{dim}" for dim in DAILY_DIMENSIONS), "flight_months", "monthly")
+
+    def tables(self) -> dict:
+        """Таблицы по именам из TABLES."""
+        return {**{f"daily-{dim}": t for dim, t in self.daily.items()},
+                "flight_months": self.flight_months, "monthly": self.monthly}
+
+    @classmethod
+    def from_tables(cls, tables: dict) -> "Aggregates":
+        return cls({dim: tables[f"daily-{dim}"] for dim in DAILY_DIMENSIONS},
+                   tables["flight_months"], tables["monthly"])
+
+    @property
+    def empty(self) -> bool:
+        return self.monthly.empty
+
+    def __len__(self) -> int:
+        """Строк во всех агрегатах."""
+        return sum(len(t) for t in self.tables().values())
+
+
+def is_aggregated(df) -> bool:
+    """Набор из load_aggregates (Aggregates), а не строки load_data."""
+    return isinstance(df, Aggregates)
+
 
-    if not dfs:
-        return pd.DataFrame()  # пусто — сигнал
+def _month_start(dates: np.ndarray) -> np.ndarray:
+    return dates.astype("datetime64[M]").astype(dates.dtype)
 
-    # склеим всё в один DataFrame
-    full = pd.concat(dfs, ignore_index=True)
-    return full
\ No newline at end of file
+
+def _flight_month_rows(flight_no, dates: np.ndarray, pax: np.ndarray) -> pd.DataFrame:
+    """Строки выгрузки в колонках агрегата рейс × месяц (каждая — группа из одной строки)."""
+    return pd.DataFrame({
+        "flight_no": flight_no, "month": _month_start(dates), "rows": np.ones(len(pax), dtype=np.int32),
+        "passengers": pax, "passengers_sq": pax * pax, "first": dates, "last": dates,
+    })
+
+
+def _group(df: pd.DataFrame, keys: list, how: dict) -> pd.DataFrame:
+    out = df.groupby(keys, sort=False, dropna=False, observed=True).agg(how).reset_index()
+    return out.astype({"rows": np.int32})
+
+
+def flight_month_sums(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Суммы по рейсу × календарному месяцу: flight_no, month (первый день месяца),
+    rows (число строк), passengers, passengers_sq (Σx и Σx²), first и last
+    (первый и последний вылет). Из них точно считаются средняя, дисперсия и
+    частота рейса за любой набор месяцев. Для Aggregates — готовая таблица
+    flight_months, для строк load_data — группировка (строки без даты не входят).
+    """
+    if is_aggregated(df):
+        return df.flight_months
+    df = df[df["dep_date"].notna()]
+    rows = _flight_month_rows(df["flight_no"].values, df["dep_date"].to_numpy(),
+                              df["passengers"].to_numpy(np.int64))
+    return _group(rows, ["flight_no", "month"], FLIGHT_MONTH_SUMS)
+
+
+def _iter_tables(fh, is_zip: bool):
+    """Блоки CSV (pa.Table по STREAM_BLOCK_BYTES) по всем файлам архива, по одному в памяти."""
+    options = _csv_options(block_size=STREAM_BLOCK_BYTES)
+
+    def tables(src):
+        for batch in pacsv.open_csv(src, **options):
+            yield pa.Table.from_batches([batch])
+
+    if not is_zip:
+        yield from tables(fh)
+        return
+    with zipfile.ZipFile(fh) as Z:
+        for name in _csv_members(Z):
+            with Z.open(name) as src:
+                yield from tables(src)
+
+
+class _Dictionary:
+    """Растущий словарь значений измерения: одинаковые коды во всех блоках архива."""
+
+    def __init__(self):
+        self.values = pd.Index([], dtype=object)
+
+    def codes(self, cat: pd.Categorical) -> np.ndarray:
+        idx = self.values.get_indexer(cat.categories)
+        new = idx < 0
+        if new.any():
+            idx[new] = len(self.values) + np.arange(new.sum())
+            self.values = self.values.append(cat.categories[new])
+        codes = cat.codes
+        return np.where(codes < 0, -1, idx[np.maximum(codes, 0)]).astype(np.int32)
+
+    def categorical(self, codes: np.ndarray) -> pd.Categorical:
+        # категории по возрастанию — как у _categorical
+        order = np.argsort(np.asarray(self.values, dtype=object), kind="stable")
+        rank = np.empty(len(order), dtype=np.int32)
+        rank[order] = np.arange(len(order), dtype=np.int32)
+        return pd.Categorical.from_codes(np.where(codes < 0, -1, rank[np.maximum(codes, 0)]),
+                                         self.values[order])
+
+
+class _Aggregator:
+    """
+    Агрегат по ключу keys, который копится по блокам архива: итоги блоков
+    сворачиваются заново (how), когда их набирается больше STREAM_COMPACT_ROWS.
+    """
+
+    def __init__(self, keys: list, how: dict):
+        self.keys, self.how = keys, how
+        self.parts, self.pending = [], 0
+
+    def add(self, rows: pd.DataFrame):
+        self.parts.append(_group(rows, self.keys, self.how))
+        self.pending += len(self.parts[-1])
+        if self.pending > STREAM_COMPACT_ROWS and len(self.parts) > 1:
+            self.parts = [self.result()]
+            self.pending = len(self.parts[0])
+
+    def result(self) -> pd.DataFrame:
+        df = pd.concat(self.parts, ignore_index=True) if len(self.parts) > 1 else self.parts[0]
+        return _group(df, self.keys, self.how)
+
+
+def aggregate_archive(fh, is_zip: bool):
+    """
+    Потоково сворачивает архив в Aggregates, не держа в памяти строки: каждый
+    блок CSV нормализуется и добавляется в три независимых агрегата —
+    дневные по каждому из DAILY_DIMENSIONS, рейс × месяц и помесячные итоги.
+    Измерения внутри — целые коды общих словарей, в категории они переводятся
+    один раз в конце. Итоги блоков сворачиваются повторно, когда их набирается
+    STREAM_COMPACT_ROWS, так что память ограничена размером агрегатов.
+
+    Суммы точные и целые: их можно складывать в любом порядке, а среднее и
+    дисперсия рейса за любые месяцы — passengers / rows и
+    (passengers_sq − passengers² / rows) / (rows − 1).
+    Для архива без строк с датой вылета возвращает None.
+    """
+    dims = {k: _Dictionary() for k in (*DAILY_DIMENSIONS, "flight_no")}
+    daily = {k: _Aggregator(["dep_date", k], SUM_ROWS) for k in DAILY_DIMENSIONS}
+    flights = _Aggregator(["flight_no", "month"], FLIGHT_MONTH_SUMS)
+    monthly = _Aggregator(["month"], SUM_ROWS)
+    for table in _iter_tables(fh, is_zip):
+        batch = _normalize(table, compact=True)
+        batch = batch[batch["dep_date"].notna()]
+        if batch.empty:
+            continue
+        codes = {k: d.codes(batch[k].array) for k, d in dims.items()}
+        dates = batch["dep_date"].to_numpy()
+        pax = batch["passengers"].to_numpy(np.int64)
+        ones = np.ones(len(pax), dtype=np.int32)
+        for k, agg in daily.items():
+            agg.add(pd.DataFrame({"dep_date": dates, k: codes[k], "passengers": pax, "rows": ones}))
+        flights.add(_flight_month_rows(codes["flight_no"], dates, pax))
+        monthly.add(pd.DataFrame({"month": _month_start(dates), "passengers": pax, "rows": ones}))
+    if not monthly.parts:
+        return None
+
+    def finish(df: pd.DataFrame, by: str) -> pd.DataFrame:
+        for k in df.columns.intersection(list(dims)):
+            df[k] = dims[k].categorical(df[k].to_numpy())
+        return df.sort_values(by, kind="stable", ignore_index=True)
+
+    return Aggregates(
+        daily={k: finish(agg.result(), "dep_date") for k, agg in daily.items()},
+        flight_months=finish(flights.result(), "month"),
+        monthly=finish(monthly.result(), "month"),
+    )
+
+
+def _read_aggregates(key: str):
+    tables = {name: _read_cache(f"{key}-{name}") for name in Aggregates.TABLES}
+    if any(t is None for t in tables.values()):
+        return None
+    return Aggregates.from_tables(tables)
+
+
+def _write_aggregates(key: str, agg: Aggregates):
+    paths = set()
+    for name, t in agg.tables().items():
+        paths.add(_cache_path(f"{key}-{name}"))
+        write_arrow(_cache_path(f"{key}-{name}"), t)
+    evict_lru(CACHE_DIR, CACHE_MAX_BYTES, keep=paths, pattern="*.arrow")
+
+
+@st.cache_resource(show_spinner="Агрегируем архив потоково…", max_entries=4)
+def load_aggregates(uploaded_file=None, path: str = None, mtime: int = None):
+    """
+    Потоковый режим для архивов больше памяти: вместо строк — Aggregates
+    (см. aggregate_archive), полный построчный DataFrame не создаётся.
+    Источник — загруженный файл (в памяти он сжат) или path на сервере
+    (например, ARCHIVE_PATH), который читается с диска потоком; mtime — часть
+    ключа кэша Streamlit. Без источника — пустой DataFrame.
+
+    Как и load_data, результат общий для всех сессий и кэшируется на диске
+    по хэшу содержимого (по файлу на таблицу);
+    attrs: dataset_key, memory, source_rows (исходных строк с датой вылета). Страницы, которым нужны отдельные
+    строки (аномалии), в этом режиме недоступны — см. is_aggregated.
+    """
+    if uploaded_file:
+        fh, is_zip = io.BytesIO(uploaded_file.getvalue()), uploaded_file.name.endswith(".zip")
+    elif path:
+        fh, is_zip = open(path, "rb"), path.endswith(".zip")
+    else:
+        return pd.DataFrame()
+    with fh:
+        with stage("content_key"):
+            key = _content_key(fh, "aggregates")
+        with stage("read_cache"):
+            agg = _read_aggregates(key)
+        if agg is not None:
+            cache_miss("disk")
+        else:
+            cache_miss()
+            with stage("stream_aggregate"):
+                agg = aggregate_archive(fh, is_zip)
+            if agg is None:
+                return pd.DataFrame()
+            _write_aggregates(key, agg)
+            shared = _read_aggregates(key)
+            if shared is not None:
+                agg = shared
+    source_rows = int(agg.monthly["rows"].to_numpy().sum(dtype=np.int64))
+    after = sum(int(t.memory_usage(deep=True, index=False).sum()) for t in agg.tables().values())
+    agg.attrs["dataset_key"] = key
+    agg.attrs["memory"] = {"after": after}
+    agg.attrs["source_rows"] = source_rows
+    record(rows=source_rows)
+    return agg